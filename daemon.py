@@ -0,0 +1,188 @@
+"""
+Headless APRS receiver: audio capture -> AFSK1200Demodulator -> APRSPacket -> MapServer.
+
+Runs without tkinter / tkintermapview / PIL, e.g. on a Raspberry Pi:
+
+    python daemon.py                              # source from config.json
+    rtl_fm -f 144.8M -s 22050 - | python daemon.py --input -
+    python daemon.py --input udp://0.0.0.0:7355
+    python daemon.py --input recording.wav
+"""
+import sys
+import time
+import signal
+import argparse
+import threading
+
+import metrics
+from decoder import APRSPacket, is_valid_callsign
+from multichannel import MultiChannelDecoder, channel_layout
+from settings import SettingsManager
+from map import MapServer
+from tiles import TileCache
+from kiss import KISSServer
+from igate import IGate
+from sources import open_source, parse_source_arg, source_configs
+from telemetry import TimeSeriesStore
+
+class APRSDaemon:
+    def __init__(self, sources, map_server=None, stats_interval=60, stop_event=None, kiss_server=None,
+                 igate=None, workers=None, series=None):
+        self.sources = sources
+        self.map_server = map_server
+        self.series = series
+        self.kiss_server = kiss_server
+        self.igate = igate
+        self.stats_interval = stats_interval
+        self.stop_event = stop_event or threading.Event()
+        self.bases, channels = channel_layout(sources)
+        if len({src.rate for src in sources}) > 1:
+            raise ValueError("all sources need the same sample rate")
+        self.decoder = MultiChannelDecoder(sources[0].rate, channels, workers, viz_channels=())
+        self.lock = threading.Lock()
+        metrics.register_capture(lambda: self.sources, lambda: self.decoder)
+
+        self.started = time.time()
+        self.samples = 0
+        self.frames = 0
+        self.packets = 0
+        self.stations = set()
+
+    def stop(self, *args):
+        self.stop_event.set()
+        for src in self.sources: src.running = False
+
+    def run(self):
+        """One capture thread per source, the main thread prints stats"""
+        threads = []
+        for src, base in zip(self.sources, self.bases):
+            t = threading.Thread(target=self.capture_loop, args=(src, base))
+            t.daemon = True
+            t.start()
+            threads.append(t)
+
+        next_stats = time.time() + self.stats_interval
+        try:
+            while any(t.is_alive() for t in threads):
+                if self.stop_event.wait(0.5): break
+                if self.stats_interval and time.time() >= next_stats:
+                    self.print_stats()
+                    next_stats = time.time() + self.stats_interval
+        finally:
+            self.stop()
+            for t in threads: t.join(2)
+            for channel, frame in self.decoder.close():
+                self.handle_packet(frame, channel)
+            self.print_stats()
+
+    def capture_loop(self, source, channel_base):
+        try:
+            for chunk in source.blocks():
+                self.samples += len(chunk) // source.channels
+                frames = self.decoder.feed(chunk, channel_base, source.channels, wait=not source.realtime)
+                decoded_at = time.monotonic()
+                for channel, frame in frames:
+                    self.handle_packet(frame, channel, decoded_at)
+        finally:
+            source.close()
+
+    def handle_packet(self, raw_bytes, channel=0, decoded_at=None):
+        with self.lock:
+            self._handle_packet(raw_bytes, channel)
+        if decoded_at is not None:
+            metrics.LATENCY.observe(time.monotonic() - decoded_at)
+
+    def _handle_packet(self, raw_bytes, channel):
+        self.frames += 1
+        if self.kiss_server: self.kiss_server.publish(raw_bytes, channel)
+        pkt = APRSPacket(raw_bytes, channel)
+        if not is_valid_callsign(pkt.callsign_src): return
+        self.packets += 1
+        self.stations.add(pkt.callsign_src)
+        print(f"[{pkt.timestamp.strftime('%H:%M:%S')}] [{channel}] {pkt.callsign_src}>{pkt.callsign_dst}: {pkt.payload}", flush=True)
+        if self.igate:
+            self.igate.submit(pkt)
+        if self.series:
+            self.series.add_packet(pkt)
+        if self.map_server:
+            self.map_server.update_station(pkt)
+        metrics.PACKETS_DISPLAYED.inc()
+
+    def print_stats(self):
+        uptime = time.time() - self.started
+        audio_s = self.samples / self.sources[0].rate
+        overruns = sum(src.overruns for src in self.sources)
+        lost = sum(src.lost for src in self.sources)
+        print(f"[STATS] up {uptime:.0f}s | audio {audio_s:.0f}s | channels {self.decoder.num_channels} | "
+              f"frames {self.frames} | packets {self.packets} | stations {len(self.stations)} | "
+              f"overruns {overruns} lost {lost} dropped {self.decoder.dropped_blocks}", flush=True)
+        if self.igate:
+            st = self.igate.stats()
+            print(f"[STATS] igate {'up' if st['connected'] else 'down'} gated {st['gated']} "
+                  f"filtered {st['filtered']} dupes {st['duplicates']} dropped {st['dropped']}", flush=True)
+        if self.kiss_server:
+            for c in self.kiss_server.stats()["clients"]:
+                print(f"[STATS] kiss {c['peer']} ({c['mode']}) sent {c['frames_sent']} "
+                      f"dropped {c['dropped']} queued {c['queued']}", flush=True)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless APRS decoder")
+    parser.add_argument("--input", action="append", help="raw s16le file/FIFO, '-' for stdin, udp://host:port or .wav file "
+                        "(default: config.json), can be given several times")
+    parser.add_argument("--channels", type=int, default=1, help="channels of the --input streams (2 = stereo)")
+    parser.add_argument("--workers", type=int, default=0, help="decoder processes (default: one per channel up to the core count)")
+    parser.add_argument("--device", type=int, help="PyAudio input device index (default: config.json)")
+    parser.add_argument("--host", default="0.0.0.0", help="map server bind address")
+    parser.add_argument("--port", type=int, default=8000, help="map server port, 0 disables it")
+    parser.add_argument("--snapshot", help="write stations.json snapshots to this path")
+    parser.add_argument("--tile-cache", default="tile_cache", help="tile cache directory, '' disables the tile proxy")
+    parser.add_argument("--tile-cache-mb", type=int, default=256, help="tile cache size limit")
+    parser.add_argument("--theme", default=None, help="map theme for the web map (default: config.json)")
+    parser.add_argument("--kiss-port", type=int, default=0, help="KISS TCP server port (e.g. 8001), 0 disables it")
+    parser.add_argument("--agw-port", type=int, default=0, help="AGWPE compatible server port, 0 disables it")
+    parser.add_argument("--igate", metavar="MYCALL", help="gate packets to APRS-IS as MYCALL")
+    parser.add_argument("--passcode", type=int, help="APRS-IS passcode of MYCALL (without it the login is unverified)")
+    parser.add_argument("--igate-server", default="rotate.aprs2.net:14580", help="APRS-IS host:port")
+    parser.add_argument("--stats", type=int, default=60, help="stats interval in seconds, 0 disables it")
+    args = parser.parse_args(argv)
+
+    stop_event = threading.Event()
+    config = SettingsManager().config
+    if args.input is None:
+        source_cfgs = source_configs(config)
+        if args.device is not None: source_cfgs[0]["device"] = args.device
+    else:
+        source_cfgs = [dict(parse_source_arg(text), channels=args.channels) for text in args.input]
+    sources = [open_source(cfg).open() for cfg in source_cfgs]
+
+    series = TimeSeriesStore()
+    map_server = None
+    if args.port:
+        tile_cache = TileCache(args.tile_cache, args.tile_cache_mb * 1024 * 1024) if args.tile_cache else None
+        map_server = MapServer(port=args.port, host=args.host, snapshot_path=args.snapshot,
+                               tile_cache=tile_cache, theme=args.theme or config["theme"], series=series)
+        if not map_server.start(): map_server = None
+
+    kiss_server = None
+    if args.kiss_port or args.agw_port:
+        kiss_server = KISSServer(args.host, args.kiss_port, args.agw_port)
+        if not kiss_server.start(): kiss_server = None
+
+    igate = None
+    if args.igate:
+        host, _, port = args.igate_server.partition(':')
+        igate = IGate(args.igate, args.passcode, host, int(port or 14580))
+        igate.start()
+
+    daemon = APRSDaemon(sources, map_server, args.stats, stop_event, kiss_server, igate, args.workers, series)
+    signal.signal(signal.SIGINT, daemon.stop)
+    signal.signal(signal.SIGTERM, daemon.stop)
+
+    daemon.run()
+    if map_server: map_server.stop()
+    if kiss_server: kiss_server.stop()
+    if igate: igate.stop()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,89 @@
 import numpy as np
 import datetime
+import time
 import re
+from collections import OrderedDict
 from scipy.signal import butter, lfilter
 
+import metrics
+
+CALLSIGN_RE = re.compile(r'^[A-Z0-9]+(?:-[0-9]{1,2})?$')
+
+# CRC-16-CCITT (reflected, as used for the AX.25 FCS)
+CRC_TABLE = []
+for _i in range(256):
+    _crc = _i
+    for _ in range(8):
+        _crc = (_crc >> 1) ^ 0x8408 if _crc & 1 else _crc >> 1
+    CRC_TABLE.append(_crc)
+
+def ax25_fcs(data):
+    crc = 0xFFFF
+    for b in data:
+        crc = (crc >> 8) ^ CRC_TABLE[(crc ^ b) & 0xFF]
+    return crc ^ 0xFFFF
+
+# APRS weather fields: letter -> (digits, name, conversion to metric)
+WX_FIELDS = {
+    'c': (3, 'wind_dir', lambda v: v),                    # degrees
+    's': (3, 'wind_speed_ms', lambda v: v * 0.44704),     # mph
+    'g': (3, 'wind_gust_ms', lambda v: v * 0.44704),      # mph
+    't': (3, 'temp_c', lambda v: (v - 32) / 1.8),         # Fahrenheit
+    'r': (3, 'rain_1h_mm', lambda v: v * 0.254),          # 1/100 inch
+    'p': (3, 'rain_24h_mm', lambda v: v * 0.254),
+    'P': (3, 'rain_midnight_mm', lambda v: v * 0.254),
+    'h': (2, 'humidity', lambda v: 100 if v == 0 else v), # %, 00 = 100
+    'b': (5, 'pressure_hpa', lambda v: v / 10.0),         # 1/10 mbar
+    'L': (3, 'luminosity', lambda v: v),                  # W/m^2
+    'l': (3, 'luminosity', lambda v: v + 1000),
+}
+WX_WIND_RE = re.compile(r'([\d. ]{3})/([\d. ]{3})')
+
+def parse_weather(text, wind=False):
+    """
+    Weather fields ('c220s004g005t077r000p000P000h50b09900...') -> dict.
+    wind: position weather report, the text starts with 'DDD/SSS' or
+    with the plain 'cDDDsSSS' fields.
+    Missing values ('...' or spaces) are left out, parsing stops at the
+    first unknown letter (software / station type follows).
+    """
+    wx = {}
+    pos = 0
+    if wind:
+        m = WX_WIND_RE.match(text)
+        if m: text = 'c' + m.group(1) + 's' + m.group(2) + text[m.end():]
+    while pos < len(text):
+        field = WX_FIELDS.get(text[pos])
+        if field is None: break
+        digits, name, convert = field
+        value = text[pos + 1:pos + 1 + digits]
+        pos += 1 + digits
+        try:
+            wx[name] = convert(int(value))
+        except ValueError:
+            continue # '...' = no sensor
+    return wx
+
+def parse_telemetry(info):
+    """'T#005,199,000,255,073,123,01101001' -> {'seq', 'a1'..'a5', 'bits'}"""
+    parts = info[2:].split(',')
+    if parts[0].startswith('MIC') and len(parts[0]) > 3:
+        # Old 'T#MIC199,...' form without comma after MIC
+        parts[0:1] = ['MIC', parts[0][3:]]
+    if len(parts) < 2: return None
+    tlm = {'seq': parts[0].strip()}
+    for i, value in enumerate(parts[1:6], 1):
+        try: tlm[f'a{i}'] = float(value)
+        except ValueError: pass
+    if len(parts) > 6:
+        bits = parts[6].strip()[:8]
+        if bits and all(b in '01' for b in bits): tlm['bits'] = int(bits.ljust(8, '0'), 2)
+    return tlm
+
+def is_valid_callsign(call):
+    if not call: return False
+    return bool(CALLSIGN_RE.match(call))
+
 class AFSK1200Demodulator:
     def __init__(self, sample_rate=22050):
         self.fs = sample_rate
@@ -25,6 +106,16 @@ class AFSK1200Demodulator:
         self.pll_phase = 0.0
         self.pll_step = self.baud / self.fs
         self.last_phase = 0
+
+        # Carried over between chunks: last limiter sample (delay line) and
+        # last sliced bit (edge detection)
+        self.last_limited = 0.0
+        self.last_bit = 0
+
+        # Slicer threshold: a limited tone of f Hz changes sign 2 * f / fs
+        # times per sample, so the discriminator averages 1 - 4 * f / fs.
+        # Midway between mark and space, independent of level and chunk size.
+        self.slice_level = 1.0 - 4.0 * (1200.0 + 2200.0) / 2 / self.fs
         
         # HDLC (High-Level Data Link Control) State
         self.packet_buffer = bytearray()
@@ -33,6 +124,69 @@ class AFSK1200Demodulator:
         self.bit_buffer = 0
         self.bit_count = 0
         
+        # Drop frames with a bad checksum
+        self.check_fcs = True
+
+        # --- TONE GATE ---
+        # Goertzel energy at 1200 / 2200 Hz in ~10 ms frames against reference
+        # bins outside the AFSK band (500, 800, 2700, 3000 Hz), i.e. against
+        # the noise floor of the channel. The demodulator only runs while
+        # AFSK is present, from a pre-roll (tail of the last skipped chunk)
+        # before the tones until a hangover after them.
+        self.gate = True
+        self.gate_frame = max(32, int(self.fs * 0.01))
+        self.gate_avg = 4 # frames per decision (~40 ms)
+        n = np.arange(self.gate_frame)
+        freqs = [1200.0, 2200.0, 500.0, 800.0, 2700.0, 3000.0]
+        self.gate_kernel = np.exp(-2j * np.pi * np.outer(n, freqs) / self.fs)
+        self.gate_floor = 0.5    # idle tone/reference ratio, white noise: 2 bins / 4 bins
+        self.gate_open_snr = 6.0 # open above floor * 6 ...
+        self.gate_hold_snr = 4.0 # ... stay open above floor * 4 (hysteresis)
+        self.gate_is_open = False
+        # Carried over between chunks, so the decision does not depend on
+        # the chunk size: samples short of a frame, the last gate_avg - 1
+        # frame powers and whether the last window was above the open level
+        self.gate_rest = np.zeros(0, dtype=np.int16)
+        self.gate_power = np.zeros((0, len(freqs)))
+        self.gate_above = False
+        self.gate_hangover = int(self.fs * 0.5)
+        self.gate_hold = 0
+        self.preroll = np.zeros(0, dtype=np.int16)
+        self.preroll_len = int(self.fs * 0.1)
+        self.gated_samples = 0
+
+    def tone_present(self, audio_chunk):
+        """
+        Vectorized Goertzel tone detector with hysteresis, updates the noise floor.
+        None while too few frames have been seen for a decision.
+        """
+        n = self.gate_frame
+        samples = np.concatenate((self.gate_rest, audio_chunk))
+        k = len(samples) // n
+        self.gate_rest = samples[k * n:]
+        if k == 0: return None
+        frames = samples[:k * n].reshape(k, n).astype(np.float64)
+        power = np.concatenate((self.gate_power, np.abs(frames @ self.gate_kernel) ** 2))
+        self.gate_power = power[1 - self.gate_avg:]
+        if len(power) < self.gate_avg: return None
+        # Sliding sums over gate_avg frames
+        csum = np.cumsum(power, axis=0)
+        csum[self.gate_avg:] -= csum[:-self.gate_avg]
+        window = csum[self.gate_avg - 1:]
+        ratio = window[:, :2].sum(axis=1) / (window[:, 2:].sum(axis=1) + 1e-9)
+        above = ratio > self.gate_floor * self.gate_open_snr
+        if self.gate_is_open:
+            present = np.any(ratio > self.gate_floor * self.gate_hold_snr)
+        else:
+            # Two windows in a row, also across chunk boundaries
+            runs = np.concatenate(([self.gate_above], above))
+            present = np.any(runs[1:] & runs[:-1])
+        self.gate_above = bool(above[-1])
+        if not present and not self.gate_is_open:
+            # Floor follows the idle channel (coloured noise, de-emphasis)
+            self.gate_floor += 0.05 * (float(np.median(ratio)) - self.gate_floor)
+        return present
+
     def process_chunk(self, audio_chunk):
         """
         Demodulates audio chunk and extracts AX.25 packets.
@@ -41,42 +195,71 @@ class AFSK1200Demodulator:
 
         max_val = np.max(np.abs(audio_chunk))
         if max_val == 0: return [], np.zeros(100)
-            
+
+        if self.gate:
+            if self.tone_present(audio_chunk):
+                self.gate_hold = self.gate_hangover
+            else:
+                self.gate_hold -= len(audio_chunk)
+            if self.gate_hold <= 0:
+                # Idle: keep the tail as pre-roll for when the gate opens
+                self.gate_is_open = False
+                self.preroll = np.concatenate((self.preroll, audio_chunk))[-self.preroll_len:]
+                self.gated_samples += len(audio_chunk)
+                metrics.GATED_SAMPLES.inc(len(audio_chunk))
+                return [], np.zeros(100)
+            chunk_len = len(audio_chunk)
+            if not self.gate_is_open:
+                # Demodulate from the pre-roll on, the filters settle on it
+                self.gate_is_open = True
+                self._reset_state()
+                audio_chunk = np.concatenate((self.preroll, audio_chunk))
+            self.preroll = self.preroll[:0]
+        else:
+            chunk_len = len(audio_chunk)
+
         # Normalize audio to -1.0 ... 1.0
         signal = audio_chunk / 32768.0
+        metrics.SAMPLES.inc(chunk_len)
+        t0 = time.perf_counter()
         
         # 1. Bandpass Filter
         signal_filtered, self.zi_bp = lfilter(self.b_bp, self.a_bp, signal, zi=self.zi_bp)
+        t1 = time.perf_counter()
         
         # 2. Hard Limiter (Amplifies weak signals to square wave)
         signal_limited = np.sign(signal_filtered)
         
         # 3. Delay-Line Discriminator (FM Demodulation)
         delayed = np.roll(signal_limited, 1)
-        delayed[0] = 0 
+        delayed[0] = self.last_limited
+        self.last_limited = signal_limited[-1]
         mixed = signal_limited * delayed
+        t2 = time.perf_counter()
         
         # 4. Lowpass Filter
         demodulated, self.zi_lp = lfilter(self.b_lp, self.a_lp, mixed, zi=self.zi_lp)
+        t3 = time.perf_counter()
         
         # 5. Bit Slicing (Decision: 0 or 1)
-        threshold = np.mean(demodulated)
-        bits_digital = (demodulated > threshold).astype(int)
+        bits_digital = (demodulated > self.slice_level).astype(int)
         
         # 6. Clock Recovery & HDLC Decoding
         packets = []
-        for i in range(1, len(bits_digital)):
+        prev_bit = self.last_bit
+        for bit in bits_digital:
             self.pll_phase += self.pll_step
             
             # Sync PLL on edge
-            if bits_digital[i] != bits_digital[i-1]:
+            if bit != prev_bit:
                 if self.pll_phase < 0.5: self.pll_phase += 0.05
                 else: self.pll_phase -= 0.05
+                prev_bit = bit
             
             # Sample bit
             if self.pll_phase >= 1.0:
                 self.pll_phase -= 1.0
-                sampled_bit = bits_digital[i]
+                sampled_bit = bit
                 
                 # NRZI Decoding
                 current_bit = 1 if sampled_bit == self.last_phase else 0
@@ -84,16 +267,42 @@ class AFSK1200Demodulator:
                 
                 pkt_bytes = self._hdlc_process(current_bit)
                 if pkt_bytes: packets.append(pkt_bytes)
+        self.last_bit = prev_bit
         
-        return packets, demodulated
+        stage = metrics.STAGE_TIME
+        stage["bandpass"].observe(t1 - t0)
+        stage["discriminator"].observe(t2 - t1)
+        stage["lowpass"].observe(t3 - t2)
+        stage["clock_recovery"].observe(time.perf_counter() - t3)
+        return packets, demodulated[-chunk_len:]
+
+    def _reset_state(self):
+        """Gate opens: filters, bit sync and HDLC have only seen noise since it closed"""
+        self.zi_bp = np.zeros_like(self.zi_bp)
+        self.zi_lp = np.zeros_like(self.zi_lp)
+        self.pll_phase = 0.0
+        self.last_phase = 0
+        self.last_limited = 0.0
+        self.last_bit = 0
+        self.packet_buffer = bytearray()
+        self.ones_in_row = 0
+        self.collecting = False
+        self.bit_buffer = 0
+        self.bit_count = 0
 
     def _hdlc_process(self, bit):
         # Flag Detection (01111110)
         if bit == 0 and self.ones_in_row == 6: 
             result = None
             if len(self.packet_buffer) > 14: 
-                # Strip CRC (last 2 bytes)
-                result = bytes(self.packet_buffer[:-2]) 
+                # Check and strip CRC (last 2 bytes, little endian)
+                body = bytes(self.packet_buffer[:-2])
+                fcs = self.packet_buffer[-2] | (self.packet_buffer[-1] << 8)
+                if not self.check_fcs or ax25_fcs(body) == fcs:
+                    result = body
+                    metrics.FRAMES.inc()
+                else:
+                    metrics.FCS_FAILURES.inc()
             self.packet_buffer = bytearray()
             self.bit_buffer = 0
             self.bit_count = 0
@@ -128,8 +337,30 @@ class AFSK1200Demodulator:
                     self.packet_buffer = bytearray()
         return None
 
+class DupeFilter:
+    """Remembers keys for 'window' seconds, is_dupe() is True for repeats"""
+    def __init__(self, window=30):
+        self.window = window
+        self.seen = OrderedDict()
+        self.dropped = 0
+
+    def is_dupe(self, key, now=None):
+        now = time.monotonic() if now is None else now
+        # Oldest entries first: purge everything outside the window
+        while self.seen:
+            k, t = next(iter(self.seen.items()))
+            if now - t < self.window: break
+            self.seen.popitem(last=False)
+        if key in self.seen:
+            self.dropped += 1
+            metrics.DUPLICATES.inc()
+            return True
+        self.seen[key] = now
+        return False
+
 class APRSPacket:
-    def __init__(self, raw_bytes=None):
+    def __init__(self, raw_bytes=None, channel=0):
+        self.channel = channel
         self.callsign_src = ""
         self.callsign_dst = ""
         self.payload = ""
@@ -138,6 +369,9 @@ class APRSPacket:
         self.symbol_table = "/" 
         self.symbol_code = ">"  
         self.comment = ""
+        self.weather = None   # dict of metric values, see parse_weather
+        self.telemetry = None # {'seq', 'a1'..'a5', 'bits'}
+        self.path = []
         # Store timestamp in UTC
         self.timestamp = datetime.datetime.now(datetime.timezone.utc)
         
@@ -151,6 +385,18 @@ class APRSPacket:
             self.callsign_dst = self._decode_call(data[0:7])
             self.callsign_src = self._decode_call(data[7:14])
             
+            # Digipeater path (max 8), bit 0 of the SSID byte marks the last address
+            # '*' = has-been-repeated bit (0x80)
+            pos = 14
+            last = data[13] & 0x01
+            while not last and pos + 7 <= len(data) and len(self.path) < 8:
+                addr = data[pos:pos+7]
+                call = self._decode_call(addr)
+                if addr[6] & 0x80: call += '*'
+                self.path.append(call)
+                last = addr[6] & 0x01
+                pos += 7
+            
             try:
                 # Find Control Field (0x03)
                 idx = data.index(b'\x03\xf0') 
@@ -173,6 +419,15 @@ class APRSPacket:
         return call.strip()
 
     def _parse_aprs_data(self, info):
+        if info.startswith('T#'):
+            self.telemetry = parse_telemetry(info)
+            return
+        if info.startswith('_'):
+            # Positionless weather: '_' MMDDHHMM fields
+            self.weather = parse_weather(info[9:]) or None
+            self.comment = info[9:].strip()
+            return
+
         # Universal Regex for Position extraction
         # (\d{4}\.\d{2}) -> Lat
         # ([NS])         -> Dir
@@ -208,4 +463,6 @@ class APRSPacket:
                     self.comment = info[end_pos:].strip()
                 else:
                     self.comment = info.strip()
+                if sym_code == '_':
+                    self.weather = parse_weather(info[end_pos:], wind=True) or None
             except: pass
\ No newline at end of file
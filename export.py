@@ -0,0 +1,376 @@
+"""
+Export of the packet log to CSV, GeoJSON, GPX and KML.
+
+Rows ([utc_time, call, lat, lon, symbol, comment, channel], as in
+APRSApp.log_data) are streamed in chunks from a worker thread and written
+straight to the file, filters (time range, callsigns, bounding box) are
+applied on the way. A name ending in .gz is written gzip compressed.
+
+GPX / KML group the positions per station (one track each). For that only
+the row numbers of every station are kept (array of 4 byte ints), the rows
+themselves are read again in a second pass.
+
+    python export.py aprs_log.csv tracks.gpx.gz --call DL1ABC-9 --bbox 47,5,55,15
+"""
+import io
+import csv
+import gzip
+import json
+import array
+import threading
+from xml.sax.saxutils import escape
+
+FORMATS = ("csv", "geojson", "gpx", "kml")
+CSV_HEADER = ["UTC_Time", "Callsign", "Latitude", "Longitude", "Symbol", "Comment", "Channel"]
+
+TIME, CALL, LAT, LON, SYMBOL, COMMENT, CHANNEL = range(7)
+
+def format_for(path):
+    """Export format from the file name (tracks.gpx.gz -> 'gpx')"""
+    name = path.lower()
+    if name.endswith(".gz"): name = name[:-3]
+    ext = name.rsplit(".", 1)[-1]
+    if ext == "json": ext = "geojson"
+    return ext if ext in FORMATS else "csv"
+
+def open_output(path):
+    """Text file, gzip compressed when the name ends in .gz"""
+    if path.lower().endswith(".gz"):
+        return io.TextIOWrapper(gzip.open(path, "wb", compresslevel=6), encoding="utf-8", newline="")
+    return open(path, "w", encoding="utf-8", newline="")
+
+def _float(value):
+    try: return float(value)
+    except (TypeError, ValueError): return None
+
+def _position(row):
+    """(lat, lon) or None; packets without a position are logged as 0.0 / 0.0"""
+    lat, lon = _float(row[LAT]), _float(row[LON])
+    if lat is None or lon is None or (lat == 0 and lon == 0): return None
+    return lat, lon
+
+class ExportFilter:
+    """
+    start / end: 'YYYY-mm-dd HH:MM:SS' (UTC, any prefix like '2024-05-01'),
+    callsigns: list, 'DL1ABC*' matches all SSIDs, bbox: (lat1, lon1, lat2, lon2)
+    """
+    def __init__(self, start=None, end=None, callsigns=None, bbox=None):
+        self.start = start or None
+        # '2024-05-01' as end includes the whole day
+        self.end = (end + "\uffff") if end else None
+        self.calls = set()
+        self.prefixes = ()
+        for call in callsigns or ():
+            call = call.strip().upper()
+            if call.endswith("*"): self.prefixes += (call[:-1],)
+            elif call: self.calls.add(call)
+        self.bbox = None
+        if bbox:
+            lat1, lon1, lat2, lon2 = (float(v) for v in bbox)
+            self.bbox = (min(lat1, lat2), min(lon1, lon2), max(lat1, lat2), max(lon1, lon2))
+
+    def match(self, row):
+        ts = row[TIME]
+        if self.start and ts < self.start: return False
+        if self.end and ts > self.end: return False
+        if self.calls or self.prefixes:
+            call = row[CALL].upper()
+            if call not in self.calls and not call.startswith(self.prefixes): return False
+        if self.bbox:
+            pos = _position(row)
+            if pos is None: return False
+            lat, lon = pos
+            if not (self.bbox[0] <= lat <= self.bbox[2] and self.bbox[1] <= lon <= self.bbox[3]): return False
+        return True
+
+# --- Writers: begin(), row(row), end() ---
+
+class CSVWriter:
+    def __init__(self, f):
+        self.writer = csv.writer(f)
+
+    def begin(self):
+        self.writer.writerow(CSV_HEADER)
+
+    def row(self, row):
+        self.writer.writerow(row)
+
+    def end(self):
+        pass
+
+class GeoJSONWriter:
+    """FeatureCollection of points, rows without a position are skipped"""
+    def __init__(self, f):
+        self.f = f
+        self.first = True
+
+    def begin(self):
+        self.f.write('{"type":"FeatureCollection","features":[\n')
+
+    def row(self, row):
+        pos = _position(row)
+        if pos is None: return False
+        lat, lon = pos
+        feature = {"type": "Feature",
+                   "geometry": {"type": "Point", "coordinates": [lon, lat]},
+                   "properties": {"time": row[TIME], "call": row[CALL], "symbol": row[SYMBOL],
+                                  "comment": row[COMMENT], "channel": row[CHANNEL]}}
+        self.f.write(("" if self.first else ",\n") + json.dumps(feature, ensure_ascii=False))
+        self.first = False
+
+    def end(self):
+        self.f.write("\n]}\n")
+
+def _iso(ts):
+    return ts.replace(" ", "T") + "Z"
+
+class GPXWriter:
+    def __init__(self, f):
+        self.f = f
+
+    def begin(self):
+        self.f.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                     '<gpx version="1.1" creator="APRS-Decoder" xmlns="http://www.topografix.com/GPX/1/1">\n')
+
+    def track_begin(self, call):
+        self.f.write(f"<trk><name>{escape(call)}</name><trkseg>\n")
+
+    def point(self, row, lat, lon):
+        self.f.write(f'<trkpt lat="{lat:.5f}" lon="{lon:.5f}"><time>{_iso(row[TIME])}</time>'
+                     f'<desc>{escape(str(row[COMMENT]))}</desc></trkpt>\n')
+
+    def track_end(self, call):
+        self.f.write("</trkseg></trk>\n")
+
+    def end(self):
+        self.f.write("</gpx>\n")
+
+class KMLWriter:
+    """One gx:Track per station (time stamped positions)"""
+    def __init__(self, f):
+        self.f = f
+        self.coords = []
+
+    def begin(self):
+        self.f.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                     '<kml xmlns="http://www.opengis.net/kml/2.2" xmlns:gx="http://www.google.com/kml/ext/2.2">\n'
+                     '<Document><name>APRS-Decoder</name>\n')
+
+    def track_begin(self, call):
+        self.f.write(f"<Placemark><name>{escape(call)}</name><gx:Track>\n")
+        self.coords = []
+
+    def point(self, row, lat, lon):
+        # gx:Track wants all <when> before the <gx:coord>; only the short
+        # coordinate strings of one station are kept until track_end()
+        self.f.write(f"<when>{_iso(row[TIME])}</when>\n")
+        self.coords.append(f"<gx:coord>{lon:.5f} {lat:.5f} 0</gx:coord>\n")
+
+    def track_end(self, call):
+        self.f.writelines(self.coords)
+        self.coords = []
+        self.f.write("</gx:Track></Placemark>\n")
+
+    def end(self):
+        self.f.write("</Document></kml>\n")
+
+WRITERS = {"csv": CSVWriter, "geojson": GeoJSONWriter, "gpx": GPXWriter, "kml": KMLWriter}
+
+class Exporter:
+    """
+    Writes rows to path in a background thread.
+    rows: list (e.g. the live log_data, only the rows present at start are
+    exported) or a callable returning a new iterator (second pass for tracks).
+    progress(done, total) and done(count, error) are called from the worker
+    thread; total is None when the size is unknown.
+    """
+    def __init__(self, rows, path, fmt=None, flt=None, chunk_size=5000, progress=None, done=None):
+        self.rows = rows
+        self.path = path
+        self.fmt = fmt or format_for(path)
+        if self.fmt not in WRITERS: raise ValueError(f"unknown export format: {self.fmt}")
+        self.flt = flt or ExportFilter()
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self.done = done
+        self.cancelled = False
+        self.exported = 0
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def cancel(self):
+        self.cancelled = True
+
+    def join(self, timeout=None):
+        if self.thread: self.thread.join(timeout)
+
+    def _chunks(self):
+        """Yields (chunk, index of its first row)"""
+        if isinstance(self.rows, list):
+            total = len(self.rows)
+            for i in range(0, total, self.chunk_size):
+                if self.cancelled: return
+                # Slicing copies only this chunk; the Tk thread may append meanwhile
+                yield self.rows[i:min(i + self.chunk_size, total)], i
+            return
+        chunk, index = [], 0
+        for row in self.rows():
+            chunk.append(row)
+            if len(chunk) >= self.chunk_size:
+                if self.cancelled: return
+                yield chunk, index
+                index += len(chunk)
+                chunk = []
+        if chunk and not self.cancelled: yield chunk, index
+
+    def _total(self):
+        return len(self.rows) if isinstance(self.rows, list) else None
+
+    def _report(self, done, passes=1, current=0):
+        if not self.progress: return
+        total = self._total()
+        if total is None:
+            self.progress(done, None)
+        else:
+            self.progress(current * total + min(done, total), passes * total)
+
+    def _run(self):
+        error = None
+        try:
+            with open_output(self.path) as f:
+                writer = WRITERS[self.fmt](f)
+                writer.begin()
+                if hasattr(writer, "track_begin"):
+                    self._write_tracks(writer)
+                else:
+                    self._write_rows(writer)
+                writer.end()
+        except Exception as e:
+            error = e
+        if self.done: self.done(self.exported, error)
+
+    def _write_rows(self, writer):
+        for chunk, index in self._chunks():
+            for row in chunk:
+                # Writers return False for rows they skip (GeoJSON without position)
+                if self.flt.match(row) and writer.row(row) is not False:
+                    self.exported += 1
+            self._report(index + len(chunk))
+
+    def _write_tracks(self, writer):
+        # Pass 1: row numbers of every station with a position
+        stations = {}
+        for chunk, index in self._chunks():
+            for i, row in enumerate(chunk, index):
+                if _position(row) is None: continue
+                if not self.flt.match(row): continue
+                idx = stations.get(row[CALL])
+                if idx is None: idx = stations[row[CALL]] = array.array("I")
+                idx.append(i)
+            self._report(index + len(chunk), 2, 0)
+
+        # Pass 2: list rows are read directly by index, an iterator is
+        # scanned again for a group of stations at a time
+        order = sorted(stations, key=lambda call: stations[call][0])
+        if isinstance(self.rows, list):
+            total = self._total()
+            points = sum(len(idx) for idx in stations.values()) or 1
+            for call in order:
+                if self.cancelled: return
+                writer.track_begin(call)
+                for i in stations[call]:
+                    row = self.rows[i]
+                    writer.point(row, float(row[LAT]), float(row[LON]))
+                    self.exported += 1
+                writer.track_end(call)
+                self._report(self.exported * total // points, 2, 1)
+            return
+        self._tracks_from_stream(writer, order, stations)
+
+    def _tracks_from_stream(self, writer, order, stations):
+        """Second pass over an iterator, buffers at most ~20 chunks of rows per scan"""
+        # Group stations so that every scan collects a bounded number of rows
+        batch, batch_rows = [], 0
+        groups = []
+        for call in order:
+            batch.append(call)
+            batch_rows += len(stations[call])
+            if batch_rows >= self.chunk_size * 20:
+                groups.append(batch)
+                batch, batch_rows = [], 0
+        if batch: groups.append(batch)
+
+        for group in groups:
+            if self.cancelled: return
+            wanted = {call: {} for call in group}
+            members = {call: set(stations[call]) for call in group}
+            for chunk, index in self._chunks():
+                for i, row in enumerate(chunk, index):
+                    call = row[CALL]
+                    if call in wanted and i in members[call]:
+                        wanted[call][i] = (row, float(row[LAT]), float(row[LON]))
+            for call in group:
+                writer.track_begin(call)
+                for i in stations[call]:
+                    point = wanted[call].get(i)
+                    if point:
+                        writer.point(*point)
+                        self.exported += 1
+                writer.track_end(call)
+            self._report(self.exported)
+
+def csv_rows(path):
+    """
+    Rows of a CSV log saved by the GUI (header is skipped). Logs saved
+    before the Channel column existed have 6 columns: channel 0. Shorter
+    rows are counted in rows.skipped (per pass).
+    """
+    def rows():
+        rows.skipped = 0
+        with open(path, newline="", encoding="utf-8") as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            for row in reader:
+                if len(row) >= 7: yield row
+                elif len(row) == 6: yield row + ["0"]
+                elif row: rows.skipped += 1
+    rows.skipped = 0
+    return rows
+
+def main(argv=None):
+    import sys
+    import argparse
+    ap = argparse.ArgumentParser(description="Export an APRS-Decoder CSV log")
+    ap.add_argument("log", help="CSV log saved by the GUI")
+    ap.add_argument("output", help="*.csv, *.geojson, *.gpx, *.kml, optionally .gz")
+    ap.add_argument("--format", choices=FORMATS)
+    ap.add_argument("--start", help="UTC, e.g. '2024-05-01 12:00'")
+    ap.add_argument("--end")
+    ap.add_argument("--call", action="append", help="callsign, DL1ABC* for all SSIDs (repeatable)")
+    ap.add_argument("--bbox", help="lat1,lon1,lat2,lon2")
+    args = ap.parse_args(argv)
+
+    flt = ExportFilter(args.start, args.end, args.call, args.bbox.split(",") if args.bbox else None)
+    result = {}
+    def progress(done, total):
+        sys.stderr.write(f"\r{done} Zeilen")
+    rows = csv_rows(args.log)
+    exporter = Exporter(rows, args.output, args.format, flt,
+                        progress=progress, done=lambda n, e: result.update(n=n, error=e)).start()
+    exporter.join()
+    sys.stderr.write("\n")
+    if rows.skipped:
+        sys.stderr.write(f"{rows.skipped} Zeilen mit weniger als 6 Spalten übersprungen\n")
+    if result.get("error"):
+        print(f"Export fehlgeschlagen: {result['error']}")
+        return 1
+    print(f"{result.get('n', 0)} Einträge exportiert -> {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
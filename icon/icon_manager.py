@@ -1,126 +1,192 @@
 import os
-import requests
+import threading
 from PIL import Image, ImageTk, ImageDraw
 
 class IconManager:
     """
     Manages APRS Icons using High-Res (128px) Spritesheets from hessu.
-    
+
     Mapping Logic (APRS 1.2 Spec):
       - '/' -> Primary Table (Sheet 0)
       - '\' -> Secondary Table (Sheet 1)
       - [0-9, A-Z] -> Overlays. These use the Secondary Table (Sheet 1) symbols,
-                      usually with an overlay character. We map them to Sheet 1.
+                      with the overlay character from Sheet 2 drawn on top.
+
+    The 128px sheets are only needed once: on first use all symbols are
+    pre-rendered at 32px into a single atlas file in the storage folder.
+    Later runs load that atlas directly. Everything happens in a background
+    thread, until it is done get_icon() hands out a fallback dot.
     """
-    def __init__(self):
-        self.cache = {} 
-        self.sheets = {} 
-        
+    ICON_SIZE = 32
+    SHEET_ICON_SIZE = 128
+    ICONS_PER_ROW = 16
+    ROWS_PER_SHEET = 6  # 96 symbols: '!' (33) .. '~' (126)
+    ATLAS_FILE = "aprs-atlas-32.png"
+
+    def __init__(self, on_ready=None):
+        self.cache = {}
+        self.fallbacks = {}
+        self.atlas = None
+        self.sheets = set() # sheets present in the atlas, missing ones get the fallback dot
+        self.on_ready = on_ready
+
         # URLs to High-Res Sheets
         self.sheet_config = {
             '0': "https://raw.githubusercontent.com/hessu/aprs-symbols/master/png/aprs-symbols-128-0.png",
             '1': "https://raw.githubusercontent.com/hessu/aprs-symbols/master/png/aprs-symbols-128-1.png",
             '2': "https://raw.githubusercontent.com/hessu/aprs-symbols/master/png/aprs-symbols-128-2.png"
         }
-        
+
         # Local storage path
         base_path = os.path.dirname(os.path.abspath(__file__))
         self.local_dir = os.path.join(base_path, "storage")
-        
+        self.atlas_path = os.path.join(self.local_dir, self.ATLAS_FILE)
+
         if not os.path.exists(self.local_dir):
             try: os.makedirs(self.local_dir)
             except: pass
 
-        # Load sheets on init
-        self._load_sheets()
+        # Load atlas in the background, never block startup
+        self.thread = threading.Thread(target=self._load_atlas)
+        self.thread.daemon = True
+        self.thread.start()
+
+    @property
+    def ready(self):
+        return self.atlas is not None
 
-    def _load_sheets(self):
+    def _load_atlas(self):
+        atlas = None
+        if os.path.exists(self.atlas_path):
+            try:
+                atlas = Image.open(self.atlas_path)
+                atlas.load()
+                atlas = atlas.convert("RGBA")
+                self.sheets = set(self.sheet_config)
+            except Exception:
+                atlas = None
+
+        if atlas is None:
+            atlas = self._build_atlas()
+
+        if atlas is not None:
+            self.atlas = atlas
+            if self.on_ready:
+                try: self.on_ready()
+                except Exception: pass
+
+    def _download_sheets(self):
+        import requests
         headers = {'User-Agent': 'Mozilla/5.0'}
+        paths = {}
         for idx, url in self.sheet_config.items():
             filename = f"aprs-symbols-128-{idx}.png"
             path = os.path.join(self.local_dir, filename)
-            
+
             # Download if missing
             if not os.path.exists(path):
                 try:
-                    # print(f"[ICON] Downloading Sheet {idx}...")
                     r = requests.get(url, headers=headers, timeout=15)
                     if r.status_code == 200:
                         with open(path, 'wb') as f:
                             f.write(r.content)
                 except Exception: pass
 
-            # Load into Memory
             if os.path.exists(path):
-                try:
-                    self.sheets[idx] = Image.open(path).convert("RGBA")
-                except Exception: pass
+                paths[idx] = path
+        return paths
+
+    def _build_atlas(self):
+        """Renders all 3 x 96 symbols at 32px into one image, stored once all sheets are there"""
+        paths = self._download_sheets()
+        if not paths: return None
+
+        size = self.ICON_SIZE
+        src = self.SHEET_ICON_SIZE
+        atlas = Image.new("RGBA", (self.ICONS_PER_ROW * size, len(self.sheet_config) * self.ROWS_PER_SHEET * size), (0, 0, 0, 0))
+
+        rendered = 0
+        for idx in sorted(self.sheet_config):
+            if idx not in paths: continue
+            try:
+                sheet = Image.open(paths[idx]).convert("RGBA")
+            except Exception:
+                continue
+
+            # Downscale the whole sheet once instead of resizing icon by icon
+            cols = sheet.width // src
+            rows = min(self.ROWS_PER_SHEET, sheet.height // src)
+            small = sheet.crop((0, 0, cols * src, rows * src)).resize((cols * size, rows * size), Image.Resampling.LANCZOS)
+            atlas.paste(small, (0, int(idx) * self.ROWS_PER_SHEET * size))
+            del sheet, small
+            self.sheets.add(idx)
+            rendered += 1
+
+        # Incomplete (partly offline): use it for now, try again next start
+        if rendered == len(self.sheet_config):
+            try:
+                atlas.save(self.atlas_path, optimize=True)
+            except Exception: pass
+        return atlas
+
+    def _tile(self, sheet_id, code):
+        """Returns the 32px PIL image of a symbol from the atlas or None"""
+        char_idx = ord(code) - 33
+        if char_idx < 0 or char_idx > 95: return None
+        if str(sheet_id) not in self.sheets: return None
+        size = self.ICON_SIZE
+        col = char_idx % self.ICONS_PER_ROW
+        row = sheet_id * self.ROWS_PER_SHEET + char_idx // self.ICONS_PER_ROW
+        x = col * size
+        y = row * size
+        return self.atlas.crop((x, y, x + size, y + size))
 
     def create_fallback_icon(self, color):
         """Creates a generic radar dot"""
+        if color in self.fallbacks: return self.fallbacks[color]
         size = 32
         image = Image.new("RGBA", (size, size), (0, 0, 0, 0))
         draw = ImageDraw.Draw(image)
         draw.ellipse([2, 2, size-2, size-2], outline=color, width=2)
         draw.ellipse([8, 8, size-8, size-8], fill=color)
-        return ImageTk.PhotoImage(image)
+        tk_img = ImageTk.PhotoImage(image)
+        self.fallbacks[color] = tk_img
+        return tk_img
 
     def get_icon(self, table, code, fallback_color):
         # Cache Key
         key = f"{table}{code}"
-        if key in self.cache: return self.cache[key]
-        
-        # --- SHEET SELECTION LOGIC ---
-        sheet_id = '0' # Default: Primary (/)
-        
-        if table == '/':
-            sheet_id = '0' # Primary
-        elif table == '\\':
-            sheet_id = '1' # Secondary
-        elif table.isalnum(): 
-            # APRS Spec: Digits/Letters as table ID mean "Overlay".
-            # The base symbol comes from the Alternate/Secondary table (Sheet 1).
-            sheet_id = '1'
-            
-        sheet = self.sheets.get(sheet_id)
-        
-        # Fallback if sheet failed to load
-        if not sheet:
+        tk_img = self.cache.get(key)
+        if tk_img is not None: return tk_img
+
+        # Atlas not there yet: show the dot, but don't cache it under the symbol
+        if self.atlas is None:
+            return self.create_fallback_icon(fallback_color)
+
+        tk_img = self._render(table, code)
+        if tk_img is None:
             tk_img = self.create_fallback_icon(fallback_color)
-            self.cache[key] = tk_img
-            return tk_img
+        self.cache[key] = tk_img
+        return tk_img
 
-        # --- GRID CALCULATION ---
-        # Grid is ASCII based starting at '!' (33)
-        # 16 icons per row
+    def _render(self, table, code):
+        # --- SHEET SELECTION LOGIC ---
         try:
-            char_idx = ord(code) - 33
-            
-            if char_idx < 0 or char_idx > 95:
-                # Invalid symbol code
-                tk_img = self.create_fallback_icon(fallback_color)
-                self.cache[key] = tk_img
-                return tk_img
-                
-            icon_size = 128
-            icons_per_row = 16
-            
-            col = char_idx % icons_per_row
-            row = char_idx // icons_per_row
-            
-            x = col * icon_size
-            y = row * icon_size
-            
-            # --- CROP & RESIZE ---
-            icon_crop = sheet.crop((x, y, x + icon_size, y + icon_size))
-            icon_final = icon_crop.resize((32, 32), Image.Resampling.LANCZOS)
-            
-            tk_img = ImageTk.PhotoImage(icon_final)
-            
-            self.cache[key] = tk_img
-            return tk_img
-            
+            if table == '/':
+                tile = self._tile(0, code) # Primary
+            elif table == '\\':
+                tile = self._tile(1, code) # Secondary
+            elif table.isalnum():
+                # APRS Spec: Digits/Letters as table ID mean "Overlay".
+                # Base symbol from the Secondary table, character from Sheet 2.
+                tile = self._tile(1, code)
+                overlay = self._tile(2, table)
+                if tile is not None and overlay is not None:
+                    tile = Image.alpha_composite(tile, overlay)
+            else:
+                tile = self._tile(0, code)
+            # Symbol or its sheet missing: caller shows the fallback dot
+            if tile is None: return None
+            return ImageTk.PhotoImage(tile)
         except Exception:
-            tk_img = self.create_fallback_icon(fallback_color)
-            self.cache[key] = tk_img
-            return tk_img
\ No newline at end of file
+            return None
@@ -0,0 +1,169 @@
+"""
+Receive-only APRS-IS iGate.
+
+Decoded packets are converted to TNC2 format (SRC>DST,PATH,qAR,MYCALL:payload)
+and sent to an APRS-IS server from a background asyncio loop. submit() never
+blocks the caller: filtering, formatting and the network all happen on the
+iGate thread. Lines are sent in batches, the outgoing queue is bounded and
+the connection is re-established with exponential backoff.
+"""
+import asyncio
+import threading
+
+from decoder import DupeFilter, is_valid_callsign
+
+# Packets with one of these in the path must not be gated (APRS-IS iGate rules)
+NOGATE = ("TCPIP", "TCPXX", "NOGATE", "RFONLY")
+
+def to_tnc2(pkt, mycall):
+    """APRSPacket -> 'SRC>DST,PATH,qAR,MYCALL:payload'"""
+    # Only the last repeated digipeater keeps its '*'
+    path = [p.rstrip('*') for p in pkt.path]
+    used = [i for i, p in enumerate(pkt.path) if p.endswith('*')]
+    if used: path[used[-1]] += '*'
+    header = ",".join([pkt.callsign_dst] + path + ["qAR", mycall])
+    return f"{pkt.callsign_src}>{header}:{pkt.payload}"
+
+def should_gate(pkt):
+    if not is_valid_callsign(pkt.callsign_src) or not pkt.payload: return False
+    if pkt.payload.startswith('?'): return False # queries stay local
+    for call in pkt.path:
+        if call.rstrip('*').split('-')[0] in NOGATE: return False
+    if pkt.payload.startswith('}'):
+        # Third party packet: check the inner header too
+        inner = pkt.payload[1:].split(':', 1)[0]
+        if any(word in inner for word in NOGATE): return False
+    if '\r' in pkt.payload or '\n' in pkt.payload: return False
+    return True
+
+class IGate:
+    def __init__(self, mycall, passcode=None, host="rotate.aprs2.net", port=14580,
+                 queue_size=500, batch_size=20, dupe_window=30, version="1.0"):
+        self.mycall = mycall.upper()
+        # The passcode has to come from the licensee, without one the login is unverified
+        self.passcode = -1 if passcode is None else passcode
+        if self.passcode == -1:
+            print(f"iGate {self.mycall}: kein Passcode, Login unverified (Pakete werden von APRS-IS nicht angenommen)")
+        self.host = host
+        self.port = port
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.version = version
+        self.dupes = DupeFilter(dupe_window)
+
+        self.loop = None
+        self.queue = None
+        self.thread = None
+        self.task = None
+        self.connected = False
+
+        self.gated = 0
+        self.filtered = 0
+        self.dropped = 0
+        self.reconnects = 0
+
+    def start(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+        print(f"iGate {self.mycall} -> {self.host}:{self.port}")
+
+    def stop(self):
+        if self.loop and self.task:
+            self.loop.call_soon_threadsafe(self.task.cancel)
+        if self.thread: self.thread.join(2)
+
+    def submit(self, pkt):
+        """Thread-safe and non-blocking, called from the decode path"""
+        if self.loop is None: return
+        try:
+            self.loop.call_soon_threadsafe(self._enqueue, pkt)
+        except RuntimeError: pass # loop already closed
+
+    def _enqueue(self, pkt):
+        if not should_gate(pkt):
+            self.filtered += 1
+            return
+        if self.dupes.is_dupe((pkt.callsign_src, pkt.callsign_dst, pkt.payload)):
+            return
+        line = to_tnc2(pkt, self.mycall)
+        if self.queue.full():
+            # Keep the newest data, drop the oldest line
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(line)
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.queue = asyncio.Queue(self.queue_size)
+        self.task = self.loop.create_task(self._connection_loop())
+        try:
+            self.loop.run_until_complete(self.task)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            tasks = asyncio.all_tasks(self.loop)
+            for task in tasks: task.cancel()
+            self.loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            self.loop.close()
+
+    async def _connection_loop(self):
+        backoff = 1
+        while True:
+            try:
+                reader, writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), 30)
+                try:
+                    await self._login(reader, writer)
+                    self.connected = True
+                    backoff = 1
+                    print(f"iGate verbunden: {self.host}:{self.port}")
+                    drain = asyncio.ensure_future(self._read_loop(reader))
+                    try:
+                        await self._send_loop(writer, drain)
+                    finally:
+                        drain.cancel()
+                finally:
+                    self.connected = False
+                    writer.close()
+            except (OSError, asyncio.TimeoutError, ConnectionError, EOFError) as e:
+                print(f"iGate getrennt ({e}), neuer Versuch in {backoff}s")
+            self.reconnects += 1
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 300)
+
+    async def _login(self, reader, writer):
+        await asyncio.wait_for(reader.readline(), 30) # server banner
+        writer.write(f"user {self.mycall} pass {self.passcode} vers APRS-Decoder {self.version}\r\n".encode('latin-1'))
+        await writer.drain()
+        while True:
+            line = await asyncio.wait_for(reader.readline(), 30)
+            if not line: raise EOFError("login closed")
+            if line.startswith(b"# logresp"):
+                if b" unverified" in line: print("iGate: Passcode nicht akzeptiert (unverified)")
+                return
+
+    async def _read_loop(self, reader):
+        """Server sends keepalives (and nothing else for a receive-only iGate)"""
+        while await reader.readline(): pass
+
+    async def _send_loop(self, writer, drain):
+        while True:
+            get = asyncio.ensure_future(self.queue.get())
+            try:
+                done, _ = await asyncio.wait([get, drain], return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                if not get.done(): get.cancel()
+            if get not in done:
+                raise ConnectionError("server closed connection")
+            lines = [get.result()]
+            while len(lines) < self.batch_size and not self.queue.empty():
+                lines.append(self.queue.get_nowait())
+            writer.write("".join(l + "\r\n" for l in lines).encode('latin-1', errors='replace'))
+            await writer.drain()
+            self.gated += len(lines)
+
+    def stats(self):
+        return {"connected": self.connected, "gated": self.gated, "filtered": self.filtered,
+                "duplicates": self.dupes.dropped, "dropped": self.dropped,
+                "queued": self.queue.qsize() if self.queue else 0, "reconnects": self.reconnects}
@@ -0,0 +1,185 @@
+"""
+KISS-over-TCP (and optional AGWPE) server that publishes every decoded
+AX.25 frame to all connected clients (Xastir, APRSIS32, loggers, ...).
+
+The server runs its own asyncio loop in a background thread. publish() only
+schedules the frame on that loop, so the decoder never waits for a client.
+Every client has a bounded queue; when a client can't keep up the oldest
+frames are dropped for that client only.
+"""
+import time
+import struct
+import asyncio
+import threading
+
+FEND = 0xC0
+FESC = 0xDB
+TFEND = 0xDC
+TFESC = 0xDD
+
+# AGWPE header: port, kind, pid, call from, call to, data length, user
+AGW_HEADER = struct.Struct('<B3xcxBx10s10sII')
+
+def kiss_encode(frame, port=0):
+    """Wraps an AX.25 frame (without FCS) into a KISS data frame"""
+    body = bytes(frame).replace(b'\xdb', b'\xdb\xdd').replace(b'\xc0', b'\xdb\xdc')
+    return bytes((FEND, (port & 0x0F) << 4)) + body + bytes((FEND,))
+
+def agw_encode(kind, data=b'', port=0, call_from=b'', call_to=b''):
+    return AGW_HEADER.pack(port, kind, 0, call_from.ljust(10, b'\0')[:10],
+                           call_to.ljust(10, b'\0')[:10], len(data), 0) + data
+
+class KISSClient:
+    def __init__(self, writer, mode, queue_size):
+        self.writer = writer
+        self.mode = mode
+        self.queue = asyncio.Queue(queue_size)
+        self.peer = writer.get_extra_info('peername')
+        self.connected = time.time()
+        self.frames_sent = 0
+        self.bytes_sent = 0
+        self.dropped = 0
+        # AGWPE clients have to ask for raw frames with 'k'
+        self.raw_enabled = (mode == 'kiss')
+
+    def offer(self, data):
+        """Called on the loop thread. Never blocks, drops oldest when full"""
+        if self.queue.full():
+            try:
+                self.queue.get_nowait()
+                self.dropped += 1
+            except asyncio.QueueEmpty: pass
+        self.queue.put_nowait(data)
+
+    def stats(self):
+        return {"peer": f"{self.peer[0]}:{self.peer[1]}" if self.peer else "?",
+                "mode": self.mode, "connected": int(time.time() - self.connected),
+                "frames_sent": self.frames_sent, "bytes_sent": self.bytes_sent,
+                "dropped": self.dropped, "queued": self.queue.qsize()}
+
+class KISSServer:
+    def __init__(self, host='0.0.0.0', port=8001, agw_port=None, queue_size=256):
+        self.host = host
+        self.port = port
+        self.agw_port = agw_port
+        self.queue_size = queue_size
+        self.clients = set()
+        self.frames_published = 0
+        self.loop = None
+        self.thread = None
+        self.servers = []
+        self.ready = threading.Event()
+        self.error = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+        self.ready.wait(5)
+        if self.error:
+            print(f"KISS Server Fehler: {self.error}")
+            return False
+        print(f"KISS Server läuft: {self.host}:{self.port}" + (f" (AGWPE {self.agw_port})" if self.agw_port else ""))
+        return True
+
+    def stop(self):
+        if self.loop and self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        if self.thread: self.thread.join(2)
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            if self.port:
+                self.servers.append(self.loop.run_until_complete(
+                    asyncio.start_server(lambda r, w: self._serve(r, w, 'kiss'), self.host, self.port)))
+            if self.agw_port:
+                self.servers.append(self.loop.run_until_complete(
+                    asyncio.start_server(lambda r, w: self._serve(r, w, 'agw'), self.host, self.agw_port)))
+        except OSError as e:
+            self.error = e
+            self.ready.set()
+            return
+        self.ready.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            for server in self.servers: server.close()
+            for client in list(self.clients): client.writer.close()
+            tasks = asyncio.all_tasks(self.loop)
+            for task in tasks: task.cancel()
+            self.loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            self.loop.close()
+
+    def publish(self, frame, channel=0):
+        """Thread-safe, returns immediately. frame = AX.25 bytes without FCS"""
+        self.frames_published += 1
+        if not self.clients or not self.loop: return
+        try:
+            self.loop.call_soon_threadsafe(self._fanout, bytes(frame), channel)
+        except RuntimeError: pass # loop already closed
+
+    def _fanout(self, frame, channel):
+        encoded = {}
+        for client in self.clients:
+            if not client.raw_enabled: continue
+            data = encoded.get(client.mode)
+            if data is None:
+                if client.mode == 'kiss':
+                    data = kiss_encode(frame, channel)
+                else:
+                    data = agw_encode(b'K', bytes((channel << 4,)) + frame, port=channel)
+                encoded[client.mode] = data
+            client.offer(data)
+
+    async def _serve(self, reader, writer, mode):
+        client = KISSClient(writer, mode, self.queue_size)
+        self.clients.add(client)
+        sender = asyncio.ensure_future(self._send_loop(client))
+        try:
+            if mode == 'agw':
+                await self._agw_read_loop(client, reader)
+            else:
+                # Receive only decoder: frames sent by the client are ignored
+                while await reader.read(4096): pass
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            sender.cancel()
+            self.clients.discard(client)
+            writer.close()
+
+    async def _send_loop(self, client):
+        try:
+            while True:
+                data = [await client.queue.get()]
+                # Batch whatever else is queued into one write
+                while not client.queue.empty():
+                    data.append(client.queue.get_nowait())
+                client.writer.write(b''.join(data))
+                await client.writer.drain()
+                client.frames_sent += len(data)
+                client.bytes_sent += sum(len(d) for d in data)
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+
+    async def _agw_read_loop(self, client, reader):
+        while True:
+            header = await reader.readexactly(AGW_HEADER.size)
+            port, kind, pid, call_from, call_to, length, user = AGW_HEADER.unpack(header)
+            if length: await reader.readexactly(length)
+
+            if kind == b'R':   # version
+                client.offer(agw_encode(b'R', struct.pack('<II', 2005, 127)))
+            elif kind == b'G': # port info
+                client.offer(agw_encode(b'G', b'1;Port1 APRS-Decoder (RX only);\0'))
+            elif kind == b'X': # register callsign
+                client.offer(agw_encode(b'X', b'\x01', call_from=call_from.rstrip(b'\0')))
+            elif kind == b'k': # toggle raw AX.25 frames
+                client.raw_enabled = not client.raw_enabled
+
+    def stats(self):
+        """Per client counters (read from any thread, values may lag slightly)"""
+        return {"published": self.frames_published,
+                "clients": [c.stats() for c in list(self.clients)]}
@@ -1,44 +1,49 @@
+import startup
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 import threading
-import queue
-import pyaudio
-import numpy as np
 import time
-import tkintermapview 
-import re
-import csv
+import sys
+import os
 from datetime import datetime
 
-# Import Logic and Settings
-from decoder import AFSK1200Demodulator, APRSPacket
+# Import Settings (Logic, Audio, Map and Icons are loaded after the first paint)
 from settings import SettingsManager
-from icon.icon_manager import IconManager
+
+startup.TIMER.mark("imports_done")
 
 class APRSApp:
     def __init__(self, root):
         self.root = root
         
-        # 1. Load Managers
+        # 1. Load Managers (heavy ones are filled in by the warmup thread)
         self.settings = SettingsManager()
-        self.demod = AFSK1200Demodulator()
-        self.icon_mgr = IconManager()
-        self.p = pyaudio.PyAudio()
+        self.decoder = None
+        self.icon_mgr = None
+        self.p = None
+        self.pyaudio = None
+        self.map_widget = None
+        self.map_server = None
+        self.series = None
+        self.kiss_server = None
+        self.igate = None
         
         # 2. App State
         self.is_running = False
-        self.audio_queue = queue.Queue()
+        self.sources = []
         self.markers = {}         
         self.marker_data = {}     
+        self.marker_symbols = {}  # call -> (table, code), icons are refreshed once the atlas is loaded
         self.active_marker_call = None
         self.paths = {}           
         self.station_history = {} 
         self.log_data = []        
+        self.exporter = None
         
         self.status_var = tk.StringVar()
         
-        # 3. Audio Devices
-        self.audio_devices = self.get_audio_devices()
+        # 3. Audio Devices (probed in the background)
+        self.audio_devices = []
         
         # 4. Initialize UI
         self.setup_ui_structure()
@@ -47,6 +52,116 @@ class APRSApp:
         # Geometry fix
         self.root.geometry("1200x900")
         self.root.update() 
+        startup.TIMER.mark("first_paint")
+        
+        # 5. Load decoder, audio and map backend without blocking the window
+        self.backend_ready = threading.Event()
+        self.warmup = threading.Thread(target=self.load_backend)
+        self.warmup.daemon = True
+        self.warmup.start()
+
+    def load_backend(self):
+        """Runs in a thread: heavy imports, filter design and device probing"""
+        timer = startup.TIMER
+        devices = []
+        try:
+            timer.timed_import("numpy")
+            timer.timed_import("scipy.signal")
+            timer.timed_import("decoder")
+            multichannel = timer.timed_import("multichannel")
+            self.decoder = multichannel.MultiChannelDecoder(22050, 1)
+            metrics = timer.timed_import("metrics")
+            metrics.register_capture(lambda: self.sources, lambda: self.decoder)
+            self.series = timer.timed_import("telemetry").TimeSeriesStore()
+            timer.mark("decoder_ready")
+            
+            self.pyaudio = timer.timed_import("pyaudio")
+            self.p = self.pyaudio.PyAudio()
+            devices = self.get_audio_devices()
+            timer.mark("audio_ready")
+        except Exception as e:
+            print(f"[STARTUP] backend failed: {e}")
+        finally:
+            self.backend_ready.set()
+        self.root.after(0, self.on_devices_loaded, devices)
+        
+        self.start_map_server()
+        self.start_kiss_server()
+        self.start_igate()
+        try:
+            timer.timed_import("tkintermapview")
+            timer.timed_import("PIL.ImageTk")
+        except Exception: pass
+        self.root.after(0, self.init_map)
+
+    def start_map_server(self):
+        """Web map + caching tile proxy, also used by the map widget"""
+        try:
+            from map import MapServer
+            from tiles import TileCache
+            server = MapServer(port=self.settings.config.get("map_port", 8000),
+                               tile_cache=TileCache(self.settings.config.get("tile_cache", "tile_cache")),
+                               theme=self.settings.config["theme"], series=self.series)
+            if server.start(): self.map_server = server
+        except Exception as e:
+            print(f"[MAP] server failed: {e}")
+
+    def start_kiss_server(self):
+        """Publishes decoded frames to KISS / AGWPE clients if enabled in config.json"""
+        kiss_port = self.settings.config.get("kiss_port", 0)
+        agw_port = self.settings.config.get("agw_port", 0)
+        if not (kiss_port or agw_port): return
+        from kiss import KISSServer
+        server = KISSServer(port=kiss_port, agw_port=agw_port)
+        if server.start(): self.kiss_server = server
+
+    def start_igate(self):
+        """APRS-IS uplink if 'igate_call' is set in config.json"""
+        call = self.settings.config.get("igate_call")
+        if not call: return
+        from igate import IGate
+        host, _, port = self.settings.config.get("igate_server", "rotate.aprs2.net:14580").partition(':')
+        self.igate = IGate(call, self.settings.config.get("igate_passcode"), host, int(port or 14580))
+        self.igate.start()
+
+    def get_tile_server(self, cfg):
+        if self.map_server:
+            return self.map_server.tile_url(self.settings.config["theme"])
+        return cfg["map_server"]
+
+    def ensure_backend(self):
+        """Blocks until the warmup thread has loaded decoder and audio"""
+        self.backend_ready.wait()
+
+    def on_devices_loaded(self, devices):
+        self.audio_devices = devices
+        self.cb_audio['values'] = devices
+        self.select_audio_device()
+
+    def init_map(self):
+        """Creates map widget and icon manager (called on the Tk thread)"""
+        import tkintermapview
+        from icon.icon_manager import IconManager
+        
+        self.map_widget = tkintermapview.TkinterMapView(self.map_container, corner_radius=0)
+        self.map_widget.pack(fill=tk.BOTH, expand=True, padx=2, pady=2)
+        self.map_widget.set_position(51.16, 10.45)
+        self.map_widget.set_zoom(6)
+        self.map_widget.set_tile_server(self.get_tile_server(self.style_cfg))
+        self.icon_mgr = IconManager(on_ready=lambda: self.root.after(0, self.refresh_marker_icons))
+        
+        startup.TIMER.mark("map_ready")
+        if "--startup-report" in sys.argv or os.environ.get("APRS_STARTUP_REPORT"):
+            print(startup.TIMER.report())
+            for err in startup.check_budget(startup.TIMER.marks):
+                print(f"[STARTUP] over budget: {err}")
+
+    def refresh_marker_icons(self):
+        """Atlas loaded: replace the fallback dots of markers placed before"""
+        for call, m in self.markers.items():
+            table, code = self.marker_symbols.get(call, ("/", ">"))
+            icon_img = self.icon_mgr.get_icon(table, code, self.style_cfg["accent"])
+            if icon_img: m.set_icon(icon_img)
 
     def get_audio_devices(self):
         devs = []
@@ -107,9 +222,10 @@ class APRSApp:
         self.log_group = ttk.LabelFrame(self.left_panel, padding=2)
         self.log_group.pack(fill=tk.BOTH, expand=True)
         
-        cols = ("Time", "Call", "Sym", "Data")
+        cols = ("Time", "Ch", "Call", "Sym", "Data")
         self.tree = ttk.Treeview(self.log_group, columns=cols, show='headings', selectmode='browse')
         self.tree.column("Time", width=70, anchor="center")
+        self.tree.column("Ch", width=30, anchor="center")
         self.tree.column("Call", width=90, anchor="w")
         self.tree.column("Sym", width=50, anchor="center")
         self.scrl = ttk.Scrollbar(self.log_group, command=self.tree.yview)
@@ -121,10 +237,7 @@ class APRSApp:
         # Right Panel (Map)
         self.map_container = ttk.LabelFrame(self.paned)
         self.paned.add(self.map_container, weight=3)
-        self.map_widget = tkintermapview.TkinterMapView(self.map_container, corner_radius=0)
-        self.map_widget.pack(fill=tk.BOTH, expand=True, padx=2, pady=2)
-        self.map_widget.set_position(51.16, 10.45)
-        self.map_widget.set_zoom(6)
+        # Map widget is created in init_map() after the first paint
         
         # Status Bar
         self.lbl_status = tk.Label(self.view_dashboard, textvariable=self.status_var, bd=2, relief=tk.SUNKEN, anchor=tk.W, padx=5)
@@ -213,13 +326,17 @@ class APRSApp:
             self.status_var.set(self.txt("STATUS_READY"))
             
         self.tree.heading("Time", text=self.txt("COL_TIME"))
+        self.tree.heading("Ch", text=self.txt("COL_CH"))
         self.tree.heading("Call", text=self.txt("COL_CALL"))
         self.tree.heading("Sym", text=self.txt("COL_SYM"))
         self.tree.heading("Data", text=self.txt("COL_MSG"))
         self.tree.tag_configure('matrix', foreground=cfg["fg"], background=cfg["panel"])
         
         self.lbl_status.config(bg=cfg["scope_bg"], fg=cfg["scope_fg"], font=cfg["font_bold"])
-        self.map_widget.set_tile_server(cfg["map_server"])
+        if self.map_widget:
+            self.map_widget.set_tile_server(self.get_tile_server(cfg))
+        if self.map_server:
+            self.map_server.set_theme(self.settings.config["theme"])
         
         # Populate Settings Dropdowns
         from settings import LANGUAGES, THEMES
@@ -228,7 +345,9 @@ class APRSApp:
         
         self.var_lang.set(self.settings.config["language"])
         self.var_theme.set(self.settings.config["theme"])
-        
+        self.select_audio_device()
+
+    def select_audio_device(self):
         idx = self.settings.config.get("audio_device_index", 0)
         if idx < len(self.audio_devices):
             self.var_audio.set(self.audio_devices[idx])
@@ -249,34 +368,127 @@ class APRSApp:
             try: audio_idx = int(sel_audio.split(':')[0])
             except: pass
             
+        old_idx = self.settings.config.get("audio_device_index", 0)
         self.settings.save_config(self.var_theme.get(), self.var_lang.get(), audio_idx)
+        # Theme / language are applied live, capture keeps running
         self.reload_ui()
         self.view_settings.place_forget()
         
-        # Restart Audio if running
+        if self.is_running and audio_idx != old_idx:
+            threading.Thread(target=self.switch_audio_device, daemon=True).start()
+
+    def switch_audio_device(self):
+        """Opens the new device next to the running one and cuts over between two blocks"""
+        from sources import open_source, source_configs
+        if self.settings.config.get("sources") or not self.sources: return
+        cfg = source_configs(self.settings.config)[0]
+        if cfg.get("type", "pyaudio") != "pyaudio": return
+        current = self.sources[0]
+        try:
+            new = open_source(cfg, pa=self.p).open()
+        except Exception as e:
+            self.root.after(0, lambda: messagebox.showerror("Error", str(e)))
+            return
+        try:
+            current.switch(new, lambda lost: self.root.after(0, self.on_device_switched, lost))
+        except ValueError:
+            # Other rate / channel count: the decoder has to be rebuilt
+            new.close()
+            self.root.after(0, self.restart_receiving)
+
+    def on_device_switched(self, lost):
+        import metrics
+        metrics.SWITCH_LOST.inc(lost)
+        print(f"Audiogerät gewechselt, {lost} Samples verloren")
         if self.is_running:
-            self.toggle_receiving() 
+            self.status_var.set(self.txt("STATUS_SWITCHED").format(lost=lost))
+
+    def restart_receiving(self):
+        if self.is_running:
+            self.toggle_receiving()
             self.root.after(500, self.toggle_receiving)
 
     def save_log(self):
         if not self.log_data:
             messagebox.showinfo("Info", "Log is empty.")
             return
+        if self.exporter and self.exporter.thread.is_alive():
+            messagebox.showinfo("Info", "Export already running.")
+            return
         filename = filedialog.asksaveasfilename(
             defaultextension=".csv",
-            filetypes=[("CSV File", "*.csv"), ("All Files", "*.*")],
+            filetypes=[("CSV File", "*.csv"), ("GeoJSON", "*.geojson"), ("GPX Tracks", "*.gpx"),
+                       ("KML Tracks", "*.kml"), ("Compressed", "*.gz"), ("All Files", "*.*")],
             initialfile=f"aprs_log_{datetime.utcnow().strftime('%Y%m%d_%H%M')}.csv"
         )
-        if filename:
+        if not filename: return
+        flt = self.ask_export_filter()
+        if flt is None: return
+        from export import Exporter
+        try:
+            self.exporter = Exporter(
+                self.log_data, filename, flt=flt,
+                progress=lambda done, total: self.root.after(0, self.on_export_progress, done, total),
+                done=lambda count, error: self.root.after(0, self.on_export_done, filename, count, error)
+            ).start()
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to save log: {e}")
+            return
+        self.btn_save.state(["disabled"])
+
+    def ask_export_filter(self):
+        """Filter dialog, prefilled from 'export_filter' in config.json. None = cancelled"""
+        from export import ExportFilter
+        defaults = self.settings.config.get("export_filter") or {}
+        dlg = tk.Toplevel(self.root)
+        dlg.title(self.txt("EXPORT_TITLE"))
+        dlg.configure(bg=self.style_cfg["bg"])
+        dlg.transient(self.root)
+        frame = ttk.Frame(dlg, padding=10)
+        frame.pack(fill=tk.BOTH, expand=True)
+
+        fields = [("start", "LBL_EXPORT_FROM", defaults.get("start") or ""),
+                  ("end", "LBL_EXPORT_TO", defaults.get("end") or ""),
+                  ("callsigns", "LBL_EXPORT_CALLS", " ".join(defaults.get("callsigns") or [])),
+                  ("bbox", "LBL_EXPORT_BBOX", ",".join(str(v) for v in defaults.get("bbox") or []))]
+        entries = {}
+        for row, (key, label, value) in enumerate(fields):
+            ttk.Label(frame, text=self.txt(label)).grid(row=row, column=0, sticky="w", pady=2)
+            var = tk.StringVar(value=value)
+            ttk.Entry(frame, textvariable=var, width=32).grid(row=row, column=1, sticky="ew", pady=2)
+            entries[key] = var
+
+        result = {}
+        def ok():
             try:
-                with open(filename, 'w', newline='', encoding='utf-8') as f:
-                    writer = csv.writer(f)
-                    writer.writerow(["UTC_Time", "Callsign", "Latitude", "Longitude", "Symbol", "Comment"])
-                    for entry in self.log_data:
-                        writer.writerow(entry)
-                messagebox.showinfo("Success", f"Log saved to {filename}")
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to save log: {e}")
+                bbox = entries["bbox"].get().replace(" ", "")
+                bbox = bbox.split(",") if bbox else None
+                if bbox and len(bbox) != 4: raise ValueError("bbox: lat1,lon1,lat2,lon2")
+                result["filter"] = ExportFilter(entries["start"].get().strip(), entries["end"].get().strip(),
+                                                entries["callsigns"].get().replace(",", " ").split(), bbox)
+            except ValueError as e:
+                messagebox.showerror("Error", str(e), parent=dlg)
+                return
+            dlg.destroy()
+
+        buttons = ttk.Frame(frame)
+        buttons.grid(row=len(fields), column=0, columnspan=2, pady=(10, 0))
+        ttk.Button(buttons, text="OK", command=ok).pack(side=tk.LEFT, padx=5)
+        ttk.Button(buttons, text=self.txt("BTN_CANCEL"), command=dlg.destroy).pack(side=tk.LEFT, padx=5)
+        dlg.grab_set()
+        self.root.wait_window(dlg)
+        return result.get("filter")
+
+    def on_export_progress(self, done, total):
+        if total: self.status_var.set(f"Export: {100 * done // total}%")
+
+    def on_export_done(self, filename, count, error):
+        self.btn_save.state(["!disabled"])
+        self.status_var.set(self.txt("STATUS_LISTENING" if self.is_running else "STATUS_READY"))
+        if error:
+            messagebox.showerror("Error", f"Failed to save log: {error}")
+        else:
+            messagebox.showinfo("Success", f"{count} entries saved to {filename}")
 
     def draw_grid(self):
         w = 1200 
@@ -290,18 +502,27 @@ class APRSApp:
     def on_list_select(self, event):
         sel = self.tree.selection()
         if sel:
-            call = self.tree.item(sel[0])['values'][1]
-            if call in self.markers:
+            call = self.tree.item(sel[0])['values'][2]
+            if call in self.markers and self.map_widget:
                 m = self.markers[call]
                 self.map_widget.set_position(m.position[0], m.position[1])
 
     def toggle_receiving(self):
         if not self.is_running:
             try:
-                idx = self.settings.config.get("audio_device_index", 0)
-                self.stream = self.p.open(format=pyaudio.paInt16, channels=1, rate=22050,
-                                        input=True, input_device_index=idx,
-                                        frames_per_buffer=4096, stream_callback=self.audio_callback)
+                self.ensure_backend()
+                if self.decoder is None: raise RuntimeError("Decoder not available")
+                from sources import open_source, source_configs, SwitchableSource
+                from multichannel import MultiChannelDecoder, channel_layout
+                
+                self.sources = []
+                for cfg in source_configs(self.settings.config):
+                    self.sources.append(SwitchableSource(open_source(cfg, pa=self.p).open()))
+                bases, channels = channel_layout(self.sources)
+                rate = self.sources[0].rate
+                if (self.decoder.rate, self.decoder.num_channels) != (rate, channels):
+                    self.decoder.close()
+                    self.decoder = MultiChannelDecoder(rate, channels, self.settings.config.get("decode_workers", 0))
                 self.is_running = True
                 
                 # Manual Button Update because it's not TTK
@@ -313,16 +534,18 @@ class APRSApp:
                 )
                 self.status_var.set(self.txt("STATUS_LISTENING"))
                 
-                t = threading.Thread(target=self.processing_loop)
-                t.daemon = True
-                t.start()
+                for source, base in zip(self.sources, bases):
+                    t = threading.Thread(target=self.processing_loop, args=(source, base))
+                    t.daemon = True
+                    t.start()
             except Exception as e:
+                for source in self.sources: source.close()
+                self.sources = []
                 messagebox.showerror("Error", str(e))
         else:
             self.is_running = False
-            if hasattr(self, 'stream'):
-                self.stream.stop_stream()
-                self.stream.close()
+            # The processing threads close their source when they leave the loop
+            for source in self.sources: source.running = False
             
             cfg = self.style_cfg
             self.btn_start.config(
@@ -332,28 +555,33 @@ class APRSApp:
             )
             self.status_var.set(self.txt("STATUS_READY"))
 
-    def audio_callback(self, in_data, frame_count, time_info, status):
-        if self.is_running: self.audio_queue.put(in_data)
-        return (None, pyaudio.paContinue)
-
-    def processing_loop(self):
-        while self.is_running:
-            try:
-                if not self.audio_queue.empty():
-                    raw = self.audio_queue.get()
-                    chunk = np.frombuffer(raw, dtype=np.int16)
-                    packets_bytes, viz_data = self.demod.process_chunk(chunk)
+    def processing_loop(self, source, channel_base):
+        import numpy as np
+        try:
+            for chunk in source.blocks():
+                if not self.is_running: break
+                try:
+                    # Files must not outrun the worker processes
+                    frames = self.decoder.feed(chunk, channel_base, source.channels, wait=not source.realtime)
+                    decoded_at = time.monotonic()
                     
-                    if np.max(np.abs(chunk)) > 800:
-                        self.root.after(0, self.draw_scope, chunk, viz_data)
+                    # Scope shows channel 0
+                    if channel_base == 0:
+                        audio = chunk[::source.channels] if source.channels > 1 else chunk
+                        if np.max(np.abs(audio)) > 800:
+                            viz_data = self.decoder.last_viz.get(0, np.zeros(100))
+                            # chunk lives in a reused buffer, the scope gets its own copy
+                            self.root.after(0, self.draw_scope, audio.copy(), viz_data)
                     
-                    for pkt_bytes in packets_bytes:
-                        self.root.after(0, self.handle_packet, pkt_bytes)
-                else:
-                    time.sleep(0.01)
-            except: pass
+                    for channel, pkt_bytes in frames:
+                        if self.kiss_server: self.kiss_server.publish(pkt_bytes, channel)
+                        self.root.after(0, self.handle_packet, pkt_bytes, channel, decoded_at)
+                except: pass
+        finally:
+            source.close()
 
     def draw_scope(self, audio, demod):
+        import numpy as np
         w = self.scope_canvas.winfo_width()
         h = self.scope_canvas.winfo_height()
         if w < 10: return
@@ -382,8 +610,8 @@ class APRSApp:
             self.scope_canvas.create_line(pts2, fill=cfg["warn"], tags="wave", width=2)
 
     def is_valid_callsign(self, call):
-        if not call: return False
-        return bool(re.match(r'^[A-Z0-9]+(?:-[0-9]{1,2})?$', call))
+        from decoder import is_valid_callsign
+        return is_valid_callsign(call)
 
     def on_marker_click(self, marker):
         """Click event for map markers to show details"""
@@ -408,15 +636,19 @@ class APRSApp:
                 
         except Exception: pass
 
-    def handle_packet(self, raw_bytes):
+    def handle_packet(self, raw_bytes, channel=0, decoded_at=None):
+        from decoder import APRSPacket
+        import metrics
         try:
-            pkt = APRSPacket(raw_bytes)
+            pkt = APRSPacket(raw_bytes, channel)
             if not pkt.callsign_src: return
             if not self.is_valid_callsign(pkt.callsign_src): return
             
             info_full = pkt.comment or pkt.payload
             info_short = info_full[:40] + "..." if len(info_full) > 40 else info_full
             time_str = pkt.timestamp.strftime('%H:%M:%S')
+            if self.igate: self.igate.submit(pkt)
+            if self.series: self.series.add_packet(pkt)
             
             # Save data for Export
             self.log_data.append([
@@ -425,16 +657,21 @@ class APRSApp:
                 pkt.latitude,
                 pkt.longitude,
                 pkt.symbol_code,
-                info_full
+                info_full,
+                pkt.channel
             ])
             
             # Add to List
             self.tree.insert('', 0, values=(
                 time_str, 
+                pkt.channel,
                 pkt.callsign_src, 
                 pkt.symbol_code,
                 info_short
             ), tags=('matrix',))
+            metrics.PACKETS_DISPLAYED.inc()
+            if decoded_at is not None:
+                metrics.LATENCY.observe(time.monotonic() - decoded_at)
             
             if pkt.latitude and pkt.longitude:
                 call = pkt.callsign_src
@@ -445,9 +682,12 @@ class APRSApp:
                 if len(self.station_history[call]) > 50: self.station_history[call].pop(0)
                 
                 # Details for Popup
-                full_details = f"{call}\n{info_full}\n{time_str} UTC"
+                full_details = f"{call}\n{info_full}\n{time_str} UTC (Ch {pkt.channel})"
                 self.marker_data[call] = full_details
+                if self.map_server: self.map_server.update_station(pkt)
+                if not self.map_widget: return
 
+                self.marker_symbols[call] = (pkt.symbol_table, pkt.symbol_code)
                 icon_img = self.icon_mgr.get_icon(pkt.symbol_table, pkt.symbol_code, self.style_cfg["accent"])
                 
                 # Marker Logic
@@ -479,5 +719,6 @@ class APRSApp:
 
 if __name__ == "__main__":
     root = tk.Tk()
+    startup.TIMER.mark("tk_root")
     app = APRSApp(root)
     root.mainloop()
\ No newline at end of file
@@ -1,55 +1,551 @@
+import os
 import json
+import gzip
+import hashlib
 import threading
 import webbrowser
-import os
-from http.server import HTTPServer, SimpleHTTPRequestHandler
+import math
+from collections import deque
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from metrics import METRICS
+
+# Spatial index: stations are kept in GRID_DEG x GRID_DEG cells
+GRID_DEG = 0.5
+# Below this zoom (or with too many stations in view) the view is clustered
+CLUSTER_ZOOM = 10
+CLUSTER_PX = 60
+MAX_VIEW_STATIONS = 2000
+
+def grid_cell(lat, lon):
+    return (int(math.floor(lon / GRID_DEG)), int(math.floor(lat / GRID_DEG)))
+
+class View:
+    """Viewport box, longitudes normalized to -180..180 (wraps = crosses the date line)"""
+    def __init__(self, south, west, north, east):
+        # The map reports longitudes beyond +-180 after panning around the globe
+        if east - west >= 360:
+            west, east = -180.0, 180.0
+        else:
+            west = (west + 180) % 360 - 180
+            east = (east + 180) % 360 - 180
+        self.south, self.west, self.north, self.east = south, west, north, east
+        self.wraps = west > east
+        x0, self.y0 = grid_cell(south, west)
+        x1, self.y1 = grid_cell(north, east)
+        if self.wraps:
+            self.xs = list(range(x0, grid_cell(0, 180 - 1e-9)[0] + 1)) + list(range(grid_cell(0, -180)[0], x1 + 1))
+        else:
+            self.xs = range(x0, x1 + 1)
+        self.xset = set(self.xs)
+
+    @classmethod
+    def from_bbox(cls, text):
+        """'west,south,east,north' (Leaflet toBBoxString order), ValueError if malformed"""
+        values = [float(v) for v in text.split(',')]
+        if len(values) != 4 or not all(math.isfinite(v) for v in values):
+            raise ValueError("bbox needs four finite numbers")
+        west, south, east, north = values
+        south, north = (min(90.0, max(-90.0, v)) for v in (south, north))
+        return cls(south, west, north, east)
+
+    def has_cell(self, cell):
+        return cell[0] in self.xset and cell[1] is not None and self.y0 <= cell[1] <= self.y1
+
+    def contains(self, lat, lon):
+        if not (self.south <= lat <= self.north): return False
+        return (lon >= self.west or lon <= self.east) if self.wraps else (self.west <= lon <= self.east)
+
+class MapRequestHandler(BaseHTTPRequestHandler):
+    """Serves page and station data straight from the MapServer in memory"""
+    map_server = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        path = url.path
+        self.query = parse_qs(url.query)
+        if path in ('/', '/aprs_map.html'):
+            self.send_cached(self.map_server.get_html(), "text/html; charset=utf-8")
+        elif path == '/stations.json':
+            self.send_cached(self.map_server.get_json(), "application/json")
+        elif path == '/events':
+            self.send_events()
+        elif path == '/changes':
+            self.send_long_poll()
+        elif path.startswith('/tiles/'):
+            self.send_tile(path)
+        elif path == '/metrics':
+            self.send_metrics()
+        elif path == '/api/stations':
+            self.send_view()
+        elif path == '/series.json':
+            self.send_series()
+        else:
+            self.send_error(404)
+
+    def get_since(self):
+        """Sequence number the client already has, None = needs snapshot"""
+        value = self.headers.get('Last-Event-ID') or self.query.get('since', [None])[0]
+        try: return int(value)
+        except (TypeError, ValueError): return None
+
+    def get_view_arg(self):
+        """Optional bbox=west,south,east,north of the client, None = everything (ValueError if malformed)"""
+        bbox = self.query.get('bbox', [None])[0]
+        if not bbox: return None
+        return View.from_bbox(bbox)
+
+    def get_zoom_arg(self):
+        """zoom=z clamped to the tile zoom range (ValueError if not a number)"""
+        from tiles import MAX_ZOOM
+        zoom = float(self.query.get('zoom', ['18'])[0])
+        if not math.isfinite(zoom): raise ValueError("zoom must be finite")
+        return min(MAX_ZOOM, max(0, int(zoom)))
+
+    def send_events(self):
+        """
+        Server-Sent Events: snapshot on connect, then only changed stations.
+        With bbox only stations inside the viewport are sent (the page
+        re-subscribes when it is panned).
+        """
+        server = self.map_server
+        try:
+            view = self.get_view_arg()
+        except ValueError:
+            self.send_error(400, "bbox=west,south,east,north expected")
+            return
+        if not server.add_client():
+            self.send_error(503, "Too many clients")
+            return
+        try:
+            self.close_connection = True
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            # A stalled client is dropped instead of piling up data
+            self.connection.settimeout(server.write_timeout)
+
+            since = self.get_since()
+            while not server.stopped:
+                seq, full, body = server.get_changes(since, view)
+                if body is not None:
+                    kind = b"snapshot" if full else b"delta"
+                    self.wfile.write(b"id: %d\nevent: %s\ndata: %s\n\n" % (seq, kind, body))
+                    self.wfile.flush()
+                    since = seq
+                elif since != seq:
+                    since = seq # changes outside the viewport
+                elif not server.wait_for_changes(since, server.keepalive):
+                    self.wfile.write(b": ping\n\n")
+                    self.wfile.flush()
+        except OSError:
+            pass
+        finally:
+            server.remove_client()
+
+    def send_long_poll(self):
+        """Fallback for clients without EventSource"""
+        server = self.map_server
+        try:
+            view = self.get_view_arg()
+        except ValueError:
+            self.send_error(400, "bbox=west,south,east,north expected")
+            return
+        since = self.get_since()
+        if since is not None:
+            server.wait_for_changes(since, server.keepalive)
+        seq, full, body = server.get_changes(since, view)
+        data = b'{"seq":%d,"full":%s,"stations":%s}' % (seq, b"true" if full else b"false", body or b"{}")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_metrics(self):
+        data = METRICS.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_tile(self, path):
+        """/tiles/<theme>/<z>/<x>/<y>.png from the local tile cache"""
+        cache = self.map_server.tile_cache
+        parts = path[len('/tiles/'):].split('/')
+        data = None
+        if cache and len(parts) == 4 and parts[3].endswith('.png'):
+            try:
+                z, x, y = int(parts[1]), int(parts[2]), int(parts[3][:-4])
+                data = cache.get(parts[0], z, x, y)
+            except ValueError: pass
+        if data is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Cache-Control", "max-age=86400")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_cached(self, entry, content_type):
+        body, gz_body, etag = entry
+
+        # Client already has this version
+        if etag in self.headers.get('If-None-Match', ''):
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        use_gzip = 'gzip' in self.headers.get('Accept-Encoding', '')
+        data = gz_body if use_gzip else body
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("ETag", etag)
+        self.send_header("Vary", "Accept-Encoding")
+        if use_gzip: self.send_header("Content-Encoding", "gzip")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_view(self):
+        """/api/stations?bbox=west,south,east,north&zoom=z (Leaflet toBBoxString order)"""
+        try:
+            view = View.from_bbox(self.query['bbox'][0])
+            zoom = self.get_zoom_arg()
+        except (KeyError, ValueError):
+            self.send_error(400, "bbox=west,south,east,north required")
+            return
+        self.send_cached(self.map_server.get_view(view, zoom), "application/json")
+
+    def send_series(self):
+        """/series.json?call=X&field=temp_c&hours=24[&res=5m], without call: stations and fields"""
+        store = self.map_server.series
+        if store is None:
+            self.send_error(404)
+            return
+        from telemetry import to_json
+        call = self.query.get('call', [None])[0]
+        if call is None:
+            result = {c: store.fields(c) for c in store.calls()}
+        else:
+            try: hours = float(self.query.get('hours', ['24'])[0])
+            except ValueError: hours = 24.0
+            res = self.query.get('res', [None])[0]
+            if res not in (None, 'raw', '5m', '1h'): res = None
+            result = to_json(store.query(call, self.query.get('field', ['temp_c'])[0], hours * 3600, res))
+            if result is None:
+                self.send_error(404)
+                return
+        data = json.dumps(result, separators=(',', ':')).encode('utf-8')
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(data)
+
+def make_cache_entry(body):
+    """(raw bytes, gzip bytes, etag) - built once, served to every client"""
+    etag = '"' + hashlib.sha1(body).hexdigest()[:16] + '"'
+    return (body, gzip.compress(body, 5), etag)
 
 class MapServer:
-    def __init__(self, port=8000):
+    def __init__(self, port=8000, host='localhost', snapshot_path=None, snapshot_interval=30,
+                 max_clients=500, changelog_size=10000, tile_cache=None, theme="Windows (Default)",
+                 series=None):
         self.stations = {}
+        self.series = series # TimeSeriesStore for /series.json
         self.port = port
+        self.host = host
+        self.tile_cache = tile_cache
+        self.theme = theme
         self.server = None
         self.thread = None
-        
+
+        # Serialized state is cached and only rebuilt when dirty
+        self.lock = threading.Lock()
+        self.dirty = True
+        self.json_cache = None
+        self.html_cache = None
+
+        # Change feed: every update gets a sequence number. Clients that fall
+        # further behind than the changelog get a full snapshot instead.
+        self.changed = threading.Condition(self.lock)
+        self.seq = 0
+        self.changelog = deque(maxlen=changelog_size)
+        self.delta_cache = {}
+
+        # Grid index, updated with every station: cell -> set of calls
+        self.grid = {}
+        self.cell_of = {}
+        self.prev_cell = {} # cell before the last move
+        self.view_cache = {}
+        self.clients = 0
+        self.max_clients = max_clients
+        self.keepalive = 15
+        self.write_timeout = 10
+        self.stopped = False
+
+        # Optional periodic snapshot to disk (instead of a write per packet)
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+        self.snapshot_thread = None
+        self.stop_event = threading.Event()
+
+        METRICS.callback("aprs_stations_active", "Stations with a position on the map", lambda: len(self.stations))
+        METRICS.callback("aprs_web_clients", "Connected live map (SSE) clients", lambda: self.clients)
+
     def start(self):
-        self.update_json()
-        self.create_html()
-        
-        handler = SimpleHTTPRequestHandler
+        handler = type("Handler", (MapRequestHandler,), {"map_server": self})
         try:
-            self.server = HTTPServer(('localhost', self.port), handler)
+            self.server = ThreadingHTTPServer((self.host, self.port), handler)
+            self.server.daemon_threads = True
             self.thread = threading.Thread(target=self.server.serve_forever)
             self.thread.daemon = True
             self.thread.start()
-            print(f"Map Server läuft: http://localhost:{self.port}/aprs_map.html")
-            return True
         except OSError:
             print(f"Port {self.port} ist belegt.")
             return False
-            
+
+        if self.snapshot_path:
+            self.snapshot_thread = threading.Thread(target=self.snapshot_loop)
+            self.snapshot_thread.daemon = True
+            self.snapshot_thread.start()
+
+        print(f"Map Server läuft: http://{self.host}:{self.port}/aprs_map.html")
+        return True
+
+    def stop(self):
+        self.stop_event.set()
+        with self.changed:
+            self.stopped = True
+            self.changed.notify_all()
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        if self.snapshot_path:
+            self.write_snapshot()
+
     def update_station(self, packet):
         if not packet.latitude: return
-        
+
         # Daten für die Web-Karte aufbereiten
-        self.stations[packet.callsign_src] = {
+        station = {
             'lat': packet.latitude,
             'lon': packet.longitude,
-            'symbol': packet.symbol,
+            'symbol': packet.symbol_table + packet.symbol_code,
             'comment': packet.comment,
+            'channel': packet.channel,
             'time': packet.timestamp.strftime('%H:%M:%S')
         }
-        self.update_json()
-        
-    def update_json(self):
-        # Schreibt die Daten in eine Datei, die das JS pollt
-        with open('stations.json', 'w') as f:
-            json.dump(self.stations, f)
-            
+        call = packet.callsign_src
+        cell = grid_cell(packet.latitude, packet.longitude)
+        with self.changed:
+            self.stations[call] = station
+            old = self.cell_of.get(call)
+            if old != cell:
+                if old is not None:
+                    self.prev_cell[call] = old
+                    members = self.grid[old]
+                    members.discard(call)
+                    if not members: del self.grid[old]
+                self.grid.setdefault(cell, set()).add(call)
+                self.cell_of[call] = cell
+            self.view_cache.clear()
+            self.dirty = True
+            self.seq += 1
+            self.changelog.append((self.seq, packet.callsign_src))
+            self.delta_cache.clear()
+            # Wake up waiting clients, they serialize their own delta
+            self.changed.notify_all()
+
+    def add_client(self):
+        with self.lock:
+            if self.clients >= self.max_clients: return False
+            self.clients += 1
+            return True
+
+    def remove_client(self):
+        with self.lock:
+            self.clients -= 1
+
+    def wait_for_changes(self, since, timeout):
+        """Blocks until seq differs from since (a stale since returns at once). False on timeout"""
+        with self.changed:
+            return self.changed.wait_for(lambda: self.seq != since or self.stopped, timeout) and not self.stopped
+
+    def get_changes(self, since, view=None):
+        """
+        Returns (seq, full, json bytes) with all stations changed after 'since'.
+        Changes are coalesced, so a slow client simply gets the latest state.
+        body is None when there is nothing new (or nothing new inside view).
+        """
+        if view is not None: return self._get_changes_in_view(since, view)
+        with self.lock:
+            seq = self.seq
+            # since > seq: id from before a server restart, client needs a snapshot
+            if since is not None and since == seq:
+                return seq, False, None
+
+            oldest = self.changelog[0][0] if self.changelog else seq + 1
+            if since is None or since < oldest - 1 or since > seq:
+                full = True
+                stations = self.stations
+            else:
+                full = False
+                key = since
+                if key in self.delta_cache:
+                    return seq, False, self.delta_cache[key]
+                stations = {}
+                for s, call in reversed(self.changelog):
+                    if s <= since: break
+                    stations[call] = self.stations[call]
+
+            body = json.dumps(stations, separators=(',', ':')).encode('utf-8')
+            if not full: self.delta_cache[since] = body
+            return seq, full, body
+
+    def get_json(self):
+        with self.lock:
+            if self.dirty or self.json_cache is None:
+                body = json.dumps(self.stations, separators=(',', ':')).encode('utf-8')
+                self.json_cache = make_cache_entry(body)
+                self.dirty = False
+            return self.json_cache
+
+    def _get_changes_in_view(self, since, view):
+        """get_changes() for one viewport, filtered per client through the grid index"""
+        with self.lock:
+            seq = self.seq
+            if since is not None and since == seq:
+                return seq, False, None
+            oldest = self.changelog[0][0] if self.changelog else seq + 1
+            full = since is None or since < oldest - 1 or since > seq
+            if full:
+                stations = self._find_in_view(view)
+            else:
+                stations = {}
+                for s, call in reversed(self.changelog):
+                    if s <= since: break
+                    if call in stations: continue
+                    # Also stations that just left the view, so the page can remove them
+                    if view.has_cell(self.cell_of[call]) or view.has_cell(self.prev_cell.get(call, (None, None))):
+                        stations[call] = self.stations[call]
+            if not full and not stations:
+                return seq, False, None
+            body = json.dumps(stations, separators=(',', ':')).encode('utf-8')
+        return seq, full, body
+
+    def _cells(self, view):
+        """Occupied grid cells overlapping the view"""
+        if len(view.xs) * (view.y1 - view.y0 + 1) > len(self.grid):
+            # Large view: checking the occupied cells is cheaper
+            return [c for c in self.grid if view.has_cell(c)]
+        return [(x, y) for x in view.xs for y in range(view.y0, view.y1 + 1) if (x, y) in self.grid]
+
+    def _find_in_view(self, view):
+        """Stations inside the view (lock must be held)"""
+        found = {}
+        for cell in self._cells(view):
+            for call in self.grid[cell]:
+                st = self.stations[call]
+                if view.contains(st['lat'], st['lon']): found[call] = st
+        return found
+
+    def query_view(self, view, zoom):
+        """
+        Stations inside the view. At low zoom (or with more than
+        MAX_VIEW_STATIONS in view) nearby stations are merged into clusters
+        of about CLUSTER_PX screen pixels: {"lat", "lon", "count"}.
+        """
+        with self.lock:
+            seq = self.seq
+            found = self._find_in_view(view)
+
+        if zoom >= CLUSTER_ZOOM and len(found) <= MAX_VIEW_STATIONS:
+            return {"seq": seq, "stations": found, "clusters": []}
+
+        # Cluster size in degrees: CLUSTER_PX of a 256 px tile at this zoom
+        size = 360.0 / (256 * 2 ** max(zoom, 0)) * CLUSTER_PX
+        groups = {}
+        for call, st in found.items():
+            key = (int(st['lon'] // size), int(st['lat'] // size))
+            g = groups.get(key)
+            if g is None: groups[key] = [call, st['lat'], st['lon'], 1]
+            else:
+                g[1] += st['lat']
+                g[2] += st['lon']
+                g[3] += 1
+        stations = {}
+        clusters = []
+        for call, lat, lon, count in groups.values():
+            if count == 1:
+                stations[call] = found[call]
+            else:
+                clusters.append({"lat": round(lat / count, 5), "lon": round(lon / count, 5), "count": count})
+        return {"seq": seq, "stations": stations, "clusters": clusters}
+
+    def get_view(self, view, zoom):
+        """Cache entry for a viewport query, reused until the next update"""
+        key = (self.seq, round(view.south, 3), round(view.west, 3), round(view.north, 3), round(view.east, 3), zoom)
+        entry = self.view_cache.get(key)
+        if entry is None:
+            body = json.dumps(self.query_view(view, zoom), separators=(',', ':'))
+            entry = make_cache_entry(body.encode('utf-8'))
+            if len(self.view_cache) > 256: self.view_cache.clear()
+            self.view_cache[key] = entry
+        return entry
+
+    def get_html(self):
+        if self.html_cache is None:
+            self.html_cache = make_cache_entry(self.create_html().encode('utf-8'))
+        return self.html_cache
+
+    def snapshot_loop(self):
+        while not self.stop_event.wait(self.snapshot_interval):
+            self.write_snapshot()
+
+    def write_snapshot(self):
+        body = self.get_json()[0]
+        tmp = self.snapshot_path + ".tmp"
+        try:
+            with open(tmp, 'wb') as f:
+                f.write(body)
+            os.replace(tmp, self.snapshot_path)
+        except OSError: pass
+
+    def set_theme(self, theme):
+        self.theme = theme
+        self.html_cache = None
+
+    def tile_url(self, theme=None, base=None):
+        """Tile URL template of the proxy, None if there is no tile cache"""
+        if not self.tile_cache: return None
+        from tiles import theme_key
+        base = f"http://localhost:{self.port}/" if base is None else base
+        return base + "tiles/" + theme_key(theme or self.theme) + "/{z}/{x}/{y}.png"
+
     def open_browser(self):
         webbrowser.open(f'http://localhost:{self.port}/aprs_map.html')
 
     def create_html(self):
-        html = """
+        tiles = self.tile_url(base="") or "https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png"
+        return """
 <!DOCTYPE html>
 <html>
 <head>
@@ -63,35 +559,109 @@ class MapServer:
     <div id="map"></div>
     <script>
         var map = L.map('map').setView([51.16, 10.45], 6); // Deutschland zentriert
-        L.tileLayer('https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png', {
+        L.tileLayer('%TILES%', {
             attribution: '&copy; OSM contributors'
         }).addTo(map);
-        
+
         var markers = {};
-        
-        function updateMap() {
-            fetch('stations.json?t=' + Date.now())
+        var clusters = L.layerGroup().addTo(map);
+        var lastSeq = null;
+        var clustered = false;
+        var events = null;
+        var polling = false;
+        var loading = null;
+        var refetch = null;
+
+        // Rufzeichen und Kommentar kommen ungeprüft vom Funk: als Text einsetzen
+        var ESCAPES = {'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'};
+        function esc(value) {
+            return String(value == null ? '' : value).replace(/[&<>"']/g, c => ESCAPES[c]);
+        }
+
+        function popup(call, st) {
+            return `<b>${esc(call)}</b><br>${esc(st.time)} (Ch ${esc(st.channel)})<br>${esc(st.comment)}`;
+        }
+
+        function setStation(call, st) {
+            if (markers[call]) {
+                markers[call].setLatLng([st.lat, st.lon]).setPopupContent(popup(call, st));
+            } else {
+                markers[call] = L.marker([st.lat, st.lon]).bindPopup(popup(call, st)).addTo(map);
+            }
+        }
+
+        // Nur Stationen im sichtbaren Ausschnitt vom Server holen
+        function loadView() {
+            if (loading) loading.abort();
+            loading = new AbortController();
+            var url = 'api/stations?bbox=' + map.getBounds().toBBoxString() + '&zoom=' + map.getZoom();
+            fetch(url, {signal: loading.signal})
                 .then(response => response.json())
-                .then(data => {
-                    for (var call in data) {
-                        var st = data[call];
-                        var content = `<b>${call}</b><br>${st.time}<br>${st.comment}`;
-                        
-                        if (markers[call]) {
-                            markers[call].setLatLng([st.lat, st.lon]).setPopupContent(content);
-                        } else {
-                            markers[call] = L.marker([st.lat, st.lon])
-                                .bindPopup(content)
-                                .addTo(map);
-                        }
+                .then(view => {
+                    for (var call in markers) {
+                        if (!(call in view.stations)) { map.removeLayer(markers[call]); delete markers[call]; }
                     }
-                });
+                    for (var call in view.stations) setStation(call, view.stations[call]);
+                    clusters.clearLayers();
+                    view.clusters.forEach(c => {
+                        L.circleMarker([c.lat, c.lon], {radius: 10 + Math.min(20, Math.log2(c.count) * 3)})
+                            .bindTooltip(String(c.count), {permanent: true, direction: 'center'})
+                            .on('click', () => map.setView([c.lat, c.lon], map.getZoom() + 2))
+                            .addTo(clusters);
+                    });
+                    clustered = view.clusters.length > 0;
+                    lastSeq = view.seq;
+                    listen(view.seq);
+                })
+                .catch(() => {});
+        }
+
+        function scheduleRefetch() {
+            if (!refetch) refetch = setTimeout(() => { refetch = null; loadView(); }, 2000);
         }
-        setInterval(updateMap, 2000); // Alle 2 Sekunden aktualisieren
-        updateMap();
+
+        function applyStations(data) {
+            // Bei Clustern ändern sich die Zahlen: Ausschnitt neu laden
+            if (clustered) { scheduleRefetch(); return; }
+            var bounds = map.getBounds();
+            for (var call in data) {
+                var st = data[call];
+                if (bounds.contains([st.lat, st.lon])) setStation(call, st);
+                else if (markers[call]) { map.removeLayer(markers[call]); delete markers[call]; }
+            }
+        }
+
+        function viewArgs() {
+            return '&bbox=' + map.getBounds().toBBoxString();
+        }
+
+        // Der Server schickt nur Änderungen im Ausschnitt: nach jedem Verschieben neu abonnieren
+        function listen(seq) {
+            if (window.EventSource) {
+                if (events) events.close();
+                events = new EventSource('events?since=' + seq + viewArgs());
+                events.addEventListener('snapshot', () => loadView());
+                events.addEventListener('delta', e => applyStations(JSON.parse(e.data)));
+            } else if (!polling) {
+                // Fallback: Long-Polling
+                polling = true;
+                function poll() {
+                    fetch('changes?since=' + lastSeq + viewArgs())
+                        .then(response => response.json())
+                        .then(data => {
+                            lastSeq = data.seq;
+                            if (data.full) loadView(); else applyStations(data.stations);
+                            poll();
+                        })
+                        .catch(() => setTimeout(poll, 5000));
+                }
+                poll();
+            }
+        }
+
+        map.on('moveend', loadView);
+        loadView();
     </script>
 </body>
 </html>
-        """
-        with open('aprs_map.html', 'w', encoding='utf-8') as f:
-            f.write(html)
\ No newline at end of file
+        """.replace('%TILES%', tiles)
@@ -0,0 +1,173 @@
+"""
+Prometheus style metrics, served by MapServer on /metrics.
+
+Updating is just an attribute increment (no locks) so it is cheap enough for
+the decode path. Text formatting only happens when /metrics is scraped.
+Worker processes ship their counters to the main process with take() / add().
+"""
+import os
+import bisect
+
+# Seconds; decode stages of one 4096 sample block and packet latency
+STAGE_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+def _labels(labels):
+    if not labels: return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in sorted(labels.items())) + "}"
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labels=None):
+        self.name = name
+        self.help = help
+        self.labels = _labels(labels)
+        self.value = 0
+
+    def inc(self, n=1):
+        self.value += n
+
+    def take(self):
+        value, self.value = self.value, 0
+        return value
+
+    def add(self, value):
+        self.value += value
+
+    def render(self):
+        return [f"{self.name}{self.labels} {self.value}"]
+
+class Callback:
+    """Value is read from fn() at scrape time (gauges, counters kept elsewhere)"""
+    def __init__(self, name, help, fn, kind="gauge", labels=None):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.kind = kind
+        self.labels = _labels(labels)
+
+    def render(self):
+        try: value = self.fn()
+        except Exception: return []
+        return [f"{self.name}{self.labels} {value}"]
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, buckets, labels=None):
+        self.name = name
+        self.help = help
+        self.label_dict = dict(labels or {})
+        self.labels = _labels(labels)
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def take(self):
+        counts, total = self.counts, self.sum
+        self.counts = [0] * len(counts)
+        self.sum = 0.0
+        return (counts, total)
+
+    def add(self, value):
+        counts, total = value
+        for i, c in enumerate(counts): self.counts[i] += c
+        self.sum += total
+
+    def render(self):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            labels = _labels(dict(self.label_dict, le=le))
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        lines.append(f"{self.name}_sum{self.labels} {self.sum}")
+        lines.append(f"{self.name}_count{self.labels} {cumulative}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+
+    def _register(self, metric):
+        key = metric.name + metric.labels
+        self.metrics[key] = metric
+        return metric
+
+    def counter(self, name, help, labels=None):
+        return self._register(Counter(name, help, labels))
+
+    def histogram(self, name, help, buckets, labels=None):
+        return self._register(Histogram(name, help, buckets, labels))
+
+    def callback(self, name, help, fn, kind="gauge", labels=None):
+        """(Re-)registers a value that is read at scrape time"""
+        return self._register(Callback(name, help, fn, kind, labels))
+
+    def take(self):
+        """Counter / histogram values since the last take() (used by worker processes)"""
+        return {key: m.take() for key, m in self.metrics.items() if hasattr(m, "take")}
+
+    def add(self, values):
+        for key, value in values.items():
+            m = self.metrics.get(key)
+            if m is not None: m.add(value)
+
+    def render(self):
+        lines = []
+        seen = set()
+        for m in list(self.metrics.values()):
+            if m.name not in seen:
+                seen.add(m.name)
+                lines.append(f"# HELP {m.name} {m.help}")
+                lines.append(f"# TYPE {m.name} {m.kind}")
+            lines.extend(m.render())
+        return "\n".join(lines) + "\n"
+
+def process_rss():
+    """Resident set size in bytes"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        try:
+            import resource
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        except ImportError:
+            return 0
+
+METRICS = Registry()
+
+def register_capture(get_sources, get_decoder):
+    """Audio overruns and queue depth, read when /metrics is scraped"""
+    METRICS.callback("aprs_audio_overruns_total", "Audio blocks lost by the sample sources",
+                     lambda: sum(src.overruns for src in get_sources()), kind="counter")
+    METRICS.callback("aprs_audio_lost_samples_total", "Audio samples lost by the sample sources",
+                     lambda: sum(src.lost for src in get_sources()), kind="counter")
+    METRICS.callback("aprs_decoder_dropped_blocks_total", "Blocks dropped because a decoder worker was busy",
+                     lambda: get_decoder().dropped_blocks, kind="counter")
+    METRICS.callback("aprs_audio_queue_depth", "Audio blocks waiting to be decoded",
+                     lambda: sum(src.queue_depth() for src in get_sources()) + get_decoder().queue_depth())
+
+SAMPLES = METRICS.counter("aprs_samples_total", "Audio samples processed by the demodulator")
+GATED_SAMPLES = METRICS.counter("aprs_gated_samples_total", "Samples skipped by the tone gate (idle channel)")
+FRAMES = METRICS.counter("aprs_frames_total", "AX.25 frames decoded with valid FCS")
+FCS_FAILURES = METRICS.counter("aprs_fcs_failures_total", "AX.25 frames dropped because of a bad FCS")
+DUPLICATES = METRICS.counter("aprs_duplicates_dropped_total", "Packets dropped by a duplicate filter")
+SWITCH_LOST = METRICS.counter("aprs_device_switch_lost_samples_total",
+                              "Audio samples lost while switching the input device")
+PACKETS_DISPLAYED = METRICS.counter("aprs_packets_displayed_total", "Packets shown in the log / map")
+STAGE_TIME = {
+    stage: METRICS.histogram("aprs_decode_stage_seconds", "Demodulator time per block and stage",
+                             STAGE_BUCKETS, {"stage": stage})
+    for stage in ("bandpass", "discriminator", "lowpass", "clock_recovery")
+}
+LATENCY = METRICS.histogram("aprs_packet_latency_seconds", "Time from frame decoded to packet displayed",
+                            LATENCY_BUCKETS)
+METRICS.callback("aprs_process_rss_bytes", "Resident memory of the process", process_rss)
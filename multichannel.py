@@ -0,0 +1,175 @@
+"""
+Decoding of several audio channels at once (stereo sound card, several
+radios / USB dongles).
+
+Interleaved blocks are split per channel and every channel keeps its own
+AFSK1200Demodulator state. With more than one channel the demodulators run
+in worker processes (channels are spread round robin over the workers), so
+throughput scales with the number of cores. Decoded frames come back as
+(channel, frame_bytes).
+"""
+import os
+import time
+import queue
+import multiprocessing as mp
+import numpy as np
+
+import metrics
+from decoder import AFSK1200Demodulator
+
+# Channel ids used by workers to send their metric counters / scope data
+METRICS_CHANNEL = -1
+VIZ_CHANNEL = -2
+# Scope data from workers is decimated to about this many points
+VIZ_POINTS = 512
+
+# Workers are not forked from the (multi-threaded) GUI / daemon process:
+# they start from a fork server that only has this module loaded
+START_METHOD = "forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn"
+
+def _worker_main(rate, inbox, outbox, viz_channels=(0,)):
+    """Worker process: one demodulator per channel it owns"""
+    # Only what this worker counts is sent back (no-op unless the fork
+    # server had counted something itself)
+    metrics.METRICS.take()
+    demods = {}
+    next_metrics = time.time() + 1
+    while True:
+        item = inbox.get()
+        if item is None or time.time() >= next_metrics:
+            outbox.put((METRICS_CHANNEL, metrics.METRICS.take()))
+            next_metrics = time.time() + 1
+        if item is None: break
+        channel, data = item
+        demod = demods.get(channel)
+        if demod is None:
+            demod = demods[channel] = AFSK1200Demodulator(rate)
+        packets, viz = demod.process_chunk(np.frombuffer(data, dtype=np.int16))
+        if channel in viz_channels:
+            step = max(1, len(viz) // VIZ_POINTS)
+            outbox.put((VIZ_CHANNEL, (channel, viz[::step].astype(np.float32).tobytes())))
+        for pkt in packets:
+            outbox.put((channel, pkt))
+
+class MultiChannelDecoder:
+    def __init__(self, sample_rate, num_channels, workers=None, queue_size=64, viz_channels=(0,)):
+        self.rate = sample_rate
+        self.num_channels = num_channels
+        if not workers:
+            workers = min(num_channels, os.cpu_count() or 1)
+        self.workers = max(1, min(workers, num_channels))
+
+        self.demods = {}
+        # Demodulator output per channel for the scope (decimated from workers)
+        self.last_viz = {}
+        self.dropped_blocks = 0
+        self.processes = []
+        self.inboxes = []
+        self.outbox = None
+
+        # A single channel (or a single core) stays in this process
+        if self.workers > 1:
+            ctx = mp.get_context(START_METHOD)
+            if START_METHOD == "forkserver": ctx.set_forkserver_preload([__name__])
+            self.outbox = ctx.Queue()
+            for _ in range(self.workers):
+                inbox = ctx.Queue(queue_size)
+                p = ctx.Process(target=_worker_main, args=(self.rate, inbox, self.outbox, tuple(viz_channels)))
+                p.daemon = True
+                p.start()
+                self.inboxes.append(inbox)
+                self.processes.append(p)
+        else:
+            for ch in range(num_channels):
+                self.demods[ch] = AFSK1200Demodulator(sample_rate)
+
+    @property
+    def in_process(self):
+        return not self.processes
+
+    def demod(self, channel):
+        """In process demodulator of a channel (None with worker processes)"""
+        return self.demods.get(channel)
+
+    def feed(self, block, channel_base=0, channels=1, wait=False):
+        """
+        block: int16 samples, interleaved when channels > 1.
+        Returns [(channel, frame_bytes)] decoded so far. Does not block unless
+        wait is set (files): when a worker can't keep up the block for that
+        channel is dropped.
+        """
+        if channels == 1:
+            columns = [block]
+        else:
+            frames = block.reshape(-1, channels)
+            columns = [frames[:, i] for i in range(channels)]
+
+        results = []
+        for i, samples in enumerate(columns):
+            channel = channel_base + i
+            if self.in_process:
+                packets, viz = self.demods[channel].process_chunk(samples)
+                self.last_viz[channel] = viz
+                results.extend((channel, pkt) for pkt in packets)
+            else:
+                inbox = self.inboxes[channel % self.workers]
+                try:
+                    inbox.put((channel, np.ascontiguousarray(samples).tobytes()), wait)
+                except queue.Full:
+                    self.dropped_blocks += 1
+
+        if not self.in_process:
+            results.extend(self.poll())
+        return results
+
+    def poll(self):
+        """Frames decoded by the worker processes since the last call"""
+        results = []
+        if self.outbox is None: return results
+        while True:
+            try:
+                channel, data = self.outbox.get_nowait()
+            except queue.Empty:
+                return results
+            if channel == METRICS_CHANNEL:
+                metrics.METRICS.add(data)
+            elif channel == VIZ_CHANNEL:
+                ch, viz = data
+                self.last_viz[ch] = np.frombuffer(viz, dtype=np.float32)
+            else:
+                results.append((channel, data))
+
+    def queue_depth(self):
+        depth = 0
+        for inbox in self.inboxes:
+            try: depth += inbox.qsize()
+            except NotImplementedError: pass # macOS
+        return depth
+
+    def close(self, timeout=5):
+        """Stops the workers after their queued blocks. Returns the last frames"""
+        results = []
+        for inbox in self.inboxes:
+            try: inbox.put(None, timeout=1)
+            except queue.Full: pass
+        # Keep draining while the workers finish, a worker with unread
+        # results in its queue can't exit
+        deadline = time.time() + timeout
+        for p in self.processes:
+            while p.is_alive() and time.time() < deadline:
+                results.extend(self.poll())
+                p.join(0.05)
+            if p.is_alive(): p.terminate()
+        results.extend(self.poll())
+        self.processes = []
+        self.inboxes = []
+        return results
+
+def channel_layout(sources):
+    """First channel id of every source: [2ch, 1ch, 1ch] -> [0, 2, 3], total 4"""
+    bases = []
+    total = 0
+    for src in sources:
+        bases.append(total)
+        total += src.channels
+    return bases, total
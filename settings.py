@@ -12,20 +12,28 @@ LANGUAGES = {
         "STOP": "Stop Receiver",
         "STATUS_READY": "System Ready - Standby",
         "STATUS_LISTENING": "Listening on 144.800 MHz (UTC)",
+        "STATUS_SWITCHED": "Audio device switched ({lost} samples lost)",
         "SCOPE_TITLE": "Signal Analysis",
         "MAP_TITLE": "Tactical Map",
         "LOG_TITLE": "Station Log",
         "COL_TIME": "Time (UTC)",
+        "COL_CH": "Ch",
         "COL_CALL": "Callsign",
         "COL_SYM": "Icon",
         "COL_MSG": "Message",
         "BTN_SETTINGS": "Settings",
-        "BTN_SAVE_LOG": "Save Log (CSV)",
+        "BTN_SAVE_LOG": "Export Log",
         "LBL_THEME": "Visual Theme:",
         "LBL_LANG": "Language:",
         "LBL_AUDIO": "Audio Device:",
         "BTN_CLOSE_SETT": "Save & Close",
-        "RESTART_MSG": "Settings saved."
+        "RESTART_MSG": "Settings saved.",
+        "EXPORT_TITLE": "Export Filter",
+        "LBL_EXPORT_FROM": "From (UTC, YYYY-MM-DD HH:MM):",
+        "LBL_EXPORT_TO": "To (UTC):",
+        "LBL_EXPORT_CALLS": "Callsigns (DL1ABC*, ...):",
+        "LBL_EXPORT_BBOX": "Area (lat1,lon1,lat2,lon2):",
+        "BTN_CANCEL": "Cancel"
     },
     "Deutsch": {
         "WINDOW_TITLE": "APRS DECODER - U96 EDITION",
@@ -34,20 +42,28 @@ LANGUAGES = {
         "STOP": "Stoppen",
         "STATUS_READY": "Bereit",
         "STATUS_LISTENING": "Empfange auf 144.800 MHz (UTC)",
+        "STATUS_SWITCHED": "Audiogerät gewechselt ({lost} Samples verloren)",
         "SCOPE_TITLE": "Signal Analyse",
         "MAP_TITLE": "Taktische Karte",
         "LOG_TITLE": "Logbuch",
         "COL_TIME": "Zeit (UTC)",
+        "COL_CH": "Kanal",
         "COL_CALL": "Rufzeichen",
         "COL_SYM": "Symbol",
         "COL_MSG": "Nachricht",
         "BTN_SETTINGS": "Einstellungen",
-        "BTN_SAVE_LOG": "Log Speichern",
+        "BTN_SAVE_LOG": "Log Exportieren",
         "LBL_THEME": "Design Thema:",
         "LBL_LANG": "Sprache:",
         "LBL_AUDIO": "Audio Gerät:",
         "BTN_CLOSE_SETT": "Speichern & Schließen",
-        "RESTART_MSG": "Einstellungen gespeichert."
+        "RESTART_MSG": "Einstellungen gespeichert.",
+        "EXPORT_TITLE": "Export Filter",
+        "LBL_EXPORT_FROM": "Von (UTC, JJJJ-MM-TT HH:MM):",
+        "LBL_EXPORT_TO": "Bis (UTC):",
+        "LBL_EXPORT_CALLS": "Rufzeichen (DL1ABC*, ...):",
+        "LBL_EXPORT_BBOX": "Gebiet (lat1,lon1,lat2,lon2):",
+        "BTN_CANCEL": "Abbrechen"
     }
 }
 
@@ -87,7 +103,17 @@ class SettingsManager:
         default = {
             "theme": "Windows (Default)", 
             "language": "English",
-            "audio_device_index": 0
+            "audio_device_index": 0,
+            "source": {"type": "pyaudio"},
+            "sources": [],
+            "decode_workers": 0,
+            "map_port": 8000,
+            "tile_cache": "tile_cache",
+            "kiss_port": 0,
+            "agw_port": 0,
+            "igate_call": "",
+            "igate_passcode": None,
+            "igate_server": "rotate.aprs2.net:14580"
         }
         if os.path.exists(CONFIG_FILE):
             try:
@@ -0,0 +1,446 @@
+"""
+Sample sources: where the audio for the demodulator comes from.
+
+Every source has the same interface:
+  - rate, channels, format ('int16')
+  - blocks(): iterator over int16 numpy arrays (interleaved if channels > 1)
+  - stats():  blocks / samples read, overruns, lost samples, queue depth
+  - close()
+
+Blocks are views into a small pool of buffers that is allocated once and
+reused, so reading does not allocate per block. A block stays valid until
+the pool wraps around (len(pool) - 1 further blocks); copy it if you need
+to keep it longer.
+
+Configured in config.json under "source", e.g.
+    {"type": "pyaudio", "device": 2}
+    {"type": "pipe", "path": "-"}                    rtl_fm ... | python daemon.py
+    {"type": "udp", "host": "0.0.0.0", "port": 7355, "seq_header": false}
+    {"type": "wav", "path": "recording.wav"}
+or, for several radios, as a list under "sources" (channel ids are
+assigned in order, a stereo source takes two).
+"""
+import sys
+import time
+import queue
+import threading
+import socket
+import struct
+import numpy as np
+
+DEFAULT_RATE = 22050
+DEFAULT_BLOCK = 4096
+
+class SampleSource:
+    format = 'int16'
+    realtime = True
+
+    def __init__(self, rate=DEFAULT_RATE, channels=1, block_size=DEFAULT_BLOCK, buffers=8):
+        self.rate = rate
+        self.channels = channels
+        self.block_size = block_size
+        self.running = False
+        self.blocks_read = 0
+        self.samples_read = 0
+        self.overruns = 0
+        self.lost = 0
+        self.last_block_time = None # monotonic time the last block was complete
+        self._alloc(buffers)
+
+    def _alloc(self, buffers):
+        self.pool = [bytearray(self.block_size * self.channels * 2) for _ in range(buffers)]
+        self.arrays = [np.frombuffer(b, dtype=np.int16) for b in self.pool]
+        self.next_buf = 0
+
+    def _take_buffer(self):
+        """Next buffer of the pool (round robin) as (bytearray, int16 view)"""
+        i = self.next_buf
+        self.next_buf = (i + 1) % len(self.pool)
+        return self.pool[i], self.arrays[i]
+
+    def _count(self, samples, t=None):
+        self.blocks_read += 1
+        self.samples_read += samples
+        self.last_block_time = time.monotonic() if t is None else t
+
+    def open(self):
+        self.running = True
+        return self
+
+    def close(self):
+        self.running = False
+
+    def blocks(self):
+        raise NotImplementedError
+
+    def queue_depth(self):
+        return 0
+
+    def stats(self):
+        return {"type": type(self).__name__, "rate": self.rate, "channels": self.channels,
+                "blocks": self.blocks_read, "samples": self.samples_read,
+                "overruns": self.overruns, "lost": self.lost, "queued": self.queue_depth()}
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
+
+class PyAudioSource(SampleSource):
+    """Sound card input. The PortAudio callback copies into the buffer pool"""
+    def __init__(self, device=None, rate=DEFAULT_RATE, channels=1, block_size=DEFAULT_BLOCK, buffers=8, pa=None):
+        super().__init__(rate, channels, block_size, buffers)
+        self.device = device
+        self.pa = pa
+        self.own_pa = pa is None
+        self.stream = None
+        # Never more queued than pool - 2: the block the consumer holds stays intact
+        self.ready = queue.Queue(buffers - 2)
+
+    def open(self):
+        import pyaudio
+        self.pyaudio = pyaudio
+        if self.pa is None: self.pa = pyaudio.PyAudio()
+        self.stream = self.pa.open(format=pyaudio.paInt16, channels=self.channels, rate=self.rate,
+                                   input=True, input_device_index=self.device,
+                                   frames_per_buffer=self.block_size, stream_callback=self._callback)
+        return super().open()
+
+    def _callback(self, in_data, frame_count, time_info, status):
+        if status & self.pyaudio.paInputOverflow: self.overruns += 1
+        if self.ready.full():
+            # Consumer is too slow: drop this block
+            self.overruns += 1
+            self.lost += frame_count
+            return (None, self.pyaudio.paContinue)
+        _, arr = self._take_buffer()
+        n = frame_count * self.channels
+        arr[:n] = np.frombuffer(in_data, dtype=np.int16, count=n)
+        self.ready.put_nowait((arr, n, time.monotonic()))
+        return (None, self.pyaudio.paContinue)
+
+    def blocks(self):
+        while self.running:
+            try:
+                arr, n, t = self.ready.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            self._count(n // self.channels, t)
+            yield arr[:n]
+
+    def queue_depth(self):
+        return self.ready.qsize()
+
+    def close(self):
+        super().close()
+        if self.stream:
+            self.stream.stop_stream()
+            self.stream.close()
+            self.stream = None
+        if self.own_pa and self.pa:
+            self.pa.terminate()
+            self.pa = None
+
+class PipeSource(SampleSource):
+    """Raw signed 16 bit little endian PCM from stdin ('-'), a FIFO or a file"""
+    def __init__(self, path='-', rate=DEFAULT_RATE, channels=1, block_size=DEFAULT_BLOCK, buffers=4):
+        super().__init__(rate, channels, block_size, buffers)
+        self.path = path
+        self.f = None
+        self.remaining = None # bytes left to read, None = until EOF
+
+    def open(self):
+        self.f = sys.stdin.buffer if self.path == '-' else open(self.path, 'rb', buffering=0)
+        return super().open()
+
+    def _fill(self, buf):
+        """Reads until the buffer is full or EOF. Returns bytes read"""
+        view = memoryview(buf)
+        if self.remaining is not None:
+            view = view[:min(len(buf), self.remaining)]
+        got = 0
+        while got < len(view):
+            n = self.f.readinto(view[got:])
+            if not n: break
+            got += n
+        if self.remaining is not None: self.remaining -= got
+        return got
+
+    def blocks(self):
+        while self.running:
+            buf, arr = self._take_buffer()
+            got = self._fill(buf)
+            n = got // 2
+            n -= n % self.channels
+            if n:
+                self._count(n // self.channels)
+                yield arr[:n]
+            if got < len(buf): break # EOF
+
+    def close(self):
+        super().close()
+        if self.f and self.f is not sys.stdin.buffer:
+            self.f.close()
+        self.f = None
+
+class WavSource(PipeSource):
+    """16 bit PCM WAV file, rate and channels come from the header"""
+    realtime = False
+
+    def __init__(self, path, block_size=DEFAULT_BLOCK, buffers=4):
+        self.wav_path = path
+        rate, channels, self.data_offset, self.data_size = self.read_header(path)
+        super().__init__(path, rate, channels, block_size, buffers)
+
+    @staticmethod
+    def read_header(path):
+        with open(path, 'rb') as f:
+            riff, _, wave = struct.unpack('<4sI4s', f.read(12))
+            if riff != b'RIFF' or wave != b'WAVE': raise ValueError("not a WAV file")
+            rate = channels = None
+            while True:
+                head = f.read(8)
+                if len(head) < 8: raise ValueError("WAV without data chunk")
+                cid, size = struct.unpack('<4sI', head)
+                if cid == b'fmt ':
+                    fmt = f.read(size)
+                    tag, channels, rate, _, _, bits = struct.unpack('<HHIIHH', fmt[:16])
+                    if tag not in (1, 0xFFFE) or bits != 16: raise ValueError("WAV must be 16 bit PCM")
+                elif cid == b'data':
+                    if rate is None: raise ValueError("WAV without fmt chunk")
+                    return rate, channels, f.tell(), size
+                else:
+                    f.seek(size + (size & 1), 1)
+
+    def open(self):
+        super().open()
+        self.f.seek(self.data_offset)
+        self.remaining = self.data_size
+        return self
+
+class UDPSource(SampleSource):
+    """
+    Raw s16le PCM in UDP datagrams (e.g. gqrx / SDR++ audio output).
+    With seq_header each datagram starts with a 32 bit big endian counter,
+    gaps in the counter are reported as lost samples.
+    """
+    MAX_DATAGRAM = 65536
+
+    def __init__(self, host='0.0.0.0', port=7355, rate=DEFAULT_RATE, channels=1, seq_header=False, buffers=16):
+        self.host = host
+        self.port = port
+        self.seq_header = seq_header
+        self.expected_seq = None
+        self.datagrams_lost = 0
+        self.sock = None
+        super().__init__(rate, channels, self.MAX_DATAGRAM // (2 * channels), buffers)
+
+    def open(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+        self.sock.bind((self.host, self.port))
+        self.sock.settimeout(0.2)
+        return super().open()
+
+    def blocks(self):
+        offset = 4 if self.seq_header else 0
+        while self.running:
+            buf, arr = self._take_buffer()
+            try:
+                got = self.sock.recv_into(buf)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            n = (got - offset) // 2
+            n -= n % self.channels
+            if n <= 0: continue
+
+            if self.seq_header:
+                seq = struct.unpack_from('>I', buf)[0]
+                if self.expected_seq is not None and seq != self.expected_seq:
+                    missed = (seq - self.expected_seq) & 0xFFFFFFFF
+                    if missed < 0x80000000: # ignore reordered / duplicate datagrams
+                        self.datagrams_lost += missed
+                        self.lost += missed * (n // self.channels)
+                        self.overruns += 1
+                self.expected_seq = (seq + 1) & 0xFFFFFFFF
+
+            self._count(n // self.channels)
+            yield arr[offset // 2:offset // 2 + n]
+
+    def close(self):
+        super().close()
+        if self.sock:
+            self.sock.close()
+            self.sock = None
+
+    def stats(self):
+        st = super().stats()
+        st["datagrams_lost"] = self.datagrams_lost
+        return st
+
+class SwitchableSource(SampleSource):
+    """
+    Wraps a source so it can be replaced while capturing (other sound card).
+    The new source is opened in parallel by the caller and handed over with
+    switch(); the cut over happens between two blocks, so the consumer (and
+    the demodulator state behind it) never sees a gap in the iteration.
+    Blocks of the new source that were recorded while the old one was still
+    read are skipped, the gap between the two streams is counted as lost.
+    """
+    # Old stream delivered nothing this long after switch(): cut over anyway
+    STALL_TIMEOUT = 1.0
+
+    def __init__(self, source):
+        self.current = source
+        self.pending = None
+        self.on_switch = None
+        self.switches = 0
+        self.switch_lost = 0
+        self.lock = threading.Lock()
+        self.rate = source.rate
+        self.channels = source.channels
+        self.block_size = source.block_size
+        self.realtime = source.realtime
+        self._running = source.running
+
+    @property
+    def running(self):
+        return self._running
+
+    @running.setter
+    def running(self, value):
+        # Stopping also ends the wrapped iterator
+        self._running = value
+        if not value: self.current.running = False
+
+    def open(self):
+        if not self.current.running: self.current.open()
+        self.running = True
+        return self
+
+    def switch(self, source, on_switch=None):
+        """
+        source: already opened, same rate / channels. on_switch(lost_samples)
+        is called from the capture thread after the cut over.
+        """
+        if (source.rate, source.channels) != (self.rate, self.channels):
+            raise ValueError("new source must have the same rate and channels")
+        with self.lock:
+            if self.pending is not None: self.pending.close()
+            self.pending = source
+            self.on_switch = on_switch
+        timer = threading.Timer(self.STALL_TIMEOUT, self._stalled, args=(self.current,))
+        timer.daemon = True
+        timer.start()
+
+    def _stalled(self, source):
+        # Ends the old block iterator (device unplugged / muted stream)
+        if self.pending is not None and self.current is source:
+            source.running = False
+
+    def _cut_over(self):
+        with self.lock:
+            new, self.pending = self.pending, None
+            on_switch = self.on_switch
+        old_end = self.current.last_block_time
+        self.current.close()
+        self.current = new
+        self.switches += 1
+        return old_end, on_switch
+
+    def blocks(self):
+        old_end = on_switch = None
+        while self.running:
+            src = self.current
+            for block in src.blocks():
+                if old_end is not None:
+                    # Recorded while the old stream was still running: already covered
+                    if src.last_block_time <= old_end: continue
+                    duration = len(block) / self.channels / self.rate
+                    gap = src.last_block_time - duration - old_end
+                    lost = max(0, int(round(gap * self.rate)))
+                    self.switch_lost += lost
+                    if on_switch: on_switch(lost)
+                    old_end = None
+                yield block
+                if self.pending is not None or not self.running: break
+            if self.pending is None: break # source ended or stopped
+            old_end, on_switch = self._cut_over()
+            if old_end is None: old_end = time.monotonic()
+
+    @property
+    def overruns(self):
+        return self.current.overruns
+
+    @property
+    def lost(self):
+        return self.current.lost + self.switch_lost
+
+    @property
+    def blocks_read(self):
+        return self.current.blocks_read
+
+    @property
+    def samples_read(self):
+        return self.current.samples_read
+
+    @property
+    def last_block_time(self):
+        return self.current.last_block_time
+
+    def queue_depth(self):
+        return self.current.queue_depth()
+
+    def close(self):
+        self.running = False
+        with self.lock:
+            pending, self.pending = self.pending, None
+        if pending: pending.close()
+        self.current.close()
+
+    def stats(self):
+        st = self.current.stats()
+        st["lost"] = self.lost
+        st["switches"] = self.switches
+        return st
+
+def open_source(cfg, pa=None):
+    """Creates (not yet opened) source from a config dict"""
+    cfg = dict(cfg or {})
+    kind = cfg.pop("type", "pyaudio")
+    if kind == "pyaudio":
+        return PyAudioSource(cfg.get("device"), cfg.get("rate", DEFAULT_RATE), cfg.get("channels", 1),
+                             cfg.get("block_size", DEFAULT_BLOCK), pa=pa)
+    if kind == "pipe":
+        return PipeSource(cfg.get("path", "-"), cfg.get("rate", DEFAULT_RATE), cfg.get("channels", 1),
+                          cfg.get("block_size", DEFAULT_BLOCK))
+    if kind == "udp":
+        return UDPSource(cfg.get("host", "0.0.0.0"), cfg.get("port", 7355), cfg.get("rate", DEFAULT_RATE),
+                         cfg.get("channels", 1), cfg.get("seq_header", False))
+    if kind == "wav":
+        return WavSource(cfg["path"], cfg.get("block_size", DEFAULT_BLOCK))
+    raise ValueError(f"unknown source type: {kind}")
+
+def source_configs(config):
+    """
+    Source configs from config.json: 'sources' (list, several radios) or
+    'source'. Sound cards default to 'audio_device_index'.
+    """
+    cfgs = config.get("sources") or [config.get("source") or {"type": "pyaudio"}]
+    cfgs = [dict(cfg) for cfg in cfgs]
+    for cfg in cfgs:
+        if cfg.get("type", "pyaudio") == "pyaudio":
+            cfg.setdefault("device", config.get("audio_device_index", 0))
+    return cfgs
+
+def parse_source_arg(text):
+    """Command line shorthand: '-', path, file.wav, udp://host:port"""
+    if text.startswith("udp://"):
+        host, _, port = text[6:].rpartition(':')
+        return {"type": "udp", "host": host or "0.0.0.0", "port": int(port)}
+    if text.lower().endswith(".wav"):
+        return {"type": "wav", "path": text}
+    return {"type": "pipe", "path": text}
@@ -0,0 +1,104 @@
+import os
+import sys
+import json
+import time
+import importlib
+import subprocess
+
+# Modules that must NOT be loaded before the first window is on screen
+HEAVY_MODULES = ("pyaudio", "numpy", "scipy", "tkintermapview", "PIL", "requests")
+
+# Cold start budget in seconds (checked by check_budget / cold_start_check)
+STARTUP_BUDGET = {
+    "import main": 0.5,
+    "first_paint": 2.0,
+}
+
+class StartupTimer:
+    """
+    Collects timing marks during startup.
+      - timed_import(): import a module and remember how long it took
+      - mark():         remember a named point in time (e.g. 'first_paint')
+    All times are seconds since the timer was created.
+    """
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.imports = {}
+        self.marks = {}
+
+    def timed_import(self, name):
+        if name in sys.modules:
+            return sys.modules[name]
+        t = time.perf_counter()
+        module = importlib.import_module(name)
+        self.imports[name] = time.perf_counter() - t
+        return module
+
+    def mark(self, name):
+        if name not in self.marks:
+            self.marks[name] = time.perf_counter() - self.t0
+        return self.marks[name]
+
+    def as_dict(self):
+        return {"imports": dict(self.imports), "marks": dict(self.marks)}
+
+    def report(self):
+        lines = ["--- Startup Report ---"]
+        for name, dt in sorted(self.imports.items(), key=lambda kv: -kv[1]):
+            lines.append(f"  import {name:<20} {dt * 1000:8.1f} ms")
+        for name, t in sorted(self.marks.items(), key=lambda kv: kv[1]):
+            lines.append(f"  {name:<27} {t * 1000:8.1f} ms")
+        return "\n".join(lines)
+
+def check_budget(timings, budget=None):
+    """
+    Compares measured times against the budget.
+    timings: flat dict {name: seconds}. Returns list of violation strings.
+    """
+    budget = STARTUP_BUDGET if budget is None else budget
+    errors = []
+    for name, limit in budget.items():
+        if name in timings and timings[name] > limit:
+            errors.append(f"{name}: {timings[name] * 1000:.0f} ms > {limit * 1000:.0f} ms")
+    return errors
+
+def heavy_modules_loaded():
+    return [m for m in HEAVY_MODULES if m in sys.modules]
+
+def cold_start_check(budget=None):
+    """
+    Imports main.py in a fresh interpreter (no window needed) and checks
+    that no heavy module is pulled in and the import stays within budget.
+    Returns (timings, errors).
+    """
+    code = (
+        "import time, json, sys\n"
+        "t = time.perf_counter()\n"
+        "import main\n"
+        "dt = time.perf_counter() - t\n"
+        "import startup\n"
+        "print(json.dumps({'import main': dt, 'heavy': startup.heavy_modules_loaded()}))\n"
+    )
+    here = os.path.dirname(os.path.abspath(__file__))
+    out = subprocess.run([sys.executable, "-c", code], cwd=here,
+                         capture_output=True, text=True, timeout=60)
+    if out.returncode != 0:
+        return {}, [f"import main failed: {out.stderr.strip()}"]
+
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    heavy = result.pop("heavy")
+    errors = check_budget(result, budget)
+    if heavy:
+        errors.append(f"heavy modules imported at startup: {', '.join(heavy)}")
+    return result, errors
+
+# Global timer, created as early as possible
+TIMER = StartupTimer()
+
+if __name__ == "__main__":
+    timings, errors = cold_start_check()
+    for name, t in timings.items():
+        print(f"{name:<20} {t * 1000:8.1f} ms")
+    for e in errors:
+        print(f"FAIL {e}")
+    sys.exit(1 if errors else 0)
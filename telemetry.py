@@ -0,0 +1,174 @@
+"""
+Per station time series of weather reports and telemetry (T#).
+
+Every station gets fixed size NumPy ring buffers at three resolutions:
+  - raw: the last RAW_SIZE reports as received
+  - 5 min and 1 h buckets: mean / min / max per field
+
+The bucket rings are aligned to time (slot = bucket number % size), so
+"the last 24 h" is a fixed set of slots: queries never scan the packet
+log and their cost only depends on the requested window, not on how many
+packets were received. Buckets without data are NaN.
+"""
+import math
+import time
+import threading
+from collections import OrderedDict
+import numpy as np
+
+WEATHER_FIELDS = ("temp_c", "humidity", "pressure_hpa", "wind_dir", "wind_speed_ms", "wind_gust_ms",
+                  "rain_1h_mm", "rain_24h_mm", "rain_midnight_mm", "luminosity")
+TELEMETRY_FIELDS = ("a1", "a2", "a3", "a4", "a5", "bits")
+
+RAW_SIZE = 720
+# name: (seconds per bucket, buckets kept)
+RESOLUTIONS = OrderedDict([("5m", (300, 576)),   # 48 h
+                           ("1h", (3600, 720))]) # 30 days
+
+class Buckets:
+    """Time aligned ring of aggregates (sum / count / min / max per field)"""
+    def __init__(self, step, size, num_fields):
+        self.step = step
+        self.size = size
+        self.bucket = np.full(size, -1, dtype=np.int64)
+        self.sum = np.zeros((size, num_fields), dtype=np.float64)
+        self.count = np.zeros((size, num_fields), dtype=np.int32)
+        self.min = np.full((size, num_fields), np.nan, dtype=np.float32)
+        self.max = np.full((size, num_fields), np.nan, dtype=np.float32)
+
+    def add(self, t, values, valid):
+        b = int(t // self.step)
+        i = b % self.size
+        if self.bucket[i] != b:
+            # Slot still holds an older bucket: start over
+            self.bucket[i] = b
+            self.sum[i] = 0
+            self.count[i] = 0
+            self.min[i] = np.nan
+            self.max[i] = np.nan
+        self.sum[i, valid] += values[valid]
+        self.count[i, valid] += 1
+        self.min[i, valid] = np.fmin(self.min[i, valid], values[valid])
+        self.max[i, valid] = np.fmax(self.max[i, valid], values[valid])
+
+    def query(self, col, start, end):
+        """Buckets from start to end: (bucket start times, mean, min, max)"""
+        first = int(start // self.step)
+        last = int(end // self.step)
+        first = max(first, last - self.size + 1)
+        buckets = np.arange(first, last + 1, dtype=np.int64)
+        slots = buckets % self.size
+        ok = self.bucket[slots] == buckets
+        count = np.where(ok, self.count[slots, col], 0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(count > 0, self.sum[slots, col] / np.maximum(count, 1), np.nan)
+        lo = np.where(count > 0, self.min[slots, col], np.nan)
+        hi = np.where(count > 0, self.max[slots, col], np.nan)
+        return buckets * self.step, mean, lo, hi
+
+class Series:
+    """All fields of one kind (weather / telemetry) of one station"""
+    def __init__(self, fields):
+        self.fields = fields
+        self.index = {name: i for i, name in enumerate(fields)}
+        self.times = np.full(RAW_SIZE, np.nan, dtype=np.float64)
+        self.raw = np.full((RAW_SIZE, len(fields)), np.nan, dtype=np.float32)
+        self.head = 0 # next raw slot
+        self.buckets = {name: Buckets(step, size, len(fields)) for name, (step, size) in RESOLUTIONS.items()}
+        self.last_time = 0.0
+
+    def add(self, t, data):
+        values = np.array([data.get(name, np.nan) for name in self.fields], dtype=np.float64)
+        valid = ~np.isnan(values)
+        if not valid.any(): return
+        i = self.head % RAW_SIZE
+        self.times[i] = t
+        self.raw[i] = values
+        self.head += 1
+        for b in self.buckets.values(): b.add(t, values, valid)
+        self.last_time = max(self.last_time, t)
+
+    def query_raw(self, col, start, end):
+        """Raw reports in [start, end], oldest first"""
+        n = min(self.head, RAW_SIZE)
+        order = (np.arange(self.head - n, self.head) % RAW_SIZE)
+        t = self.times[order]
+        v = self.raw[order, col]
+        keep = (t >= start) & (t <= end) & ~np.isnan(v)
+        return t[keep], v[keep]
+
+class TimeSeriesStore:
+    """
+    add_packet(pkt) from the decode path, query() from anywhere (thread-safe).
+    Least recently updated stations are dropped beyond max_stations.
+    """
+    def __init__(self, max_stations=500):
+        self.max_stations = max_stations
+        self.stations = OrderedDict() # call -> {"wx": Series, "tlm": Series}
+        self.lock = threading.Lock()
+
+    def add_packet(self, pkt, t=None):
+        if not pkt.weather and not pkt.telemetry: return False
+        if t is None: t = pkt.timestamp.timestamp()
+        with self.lock:
+            series = self.stations.get(pkt.callsign_src)
+            if series is None:
+                series = self.stations[pkt.callsign_src] = {}
+                if len(self.stations) > self.max_stations:
+                    self.stations.popitem(last=False)
+            else:
+                self.stations.move_to_end(pkt.callsign_src)
+            if pkt.weather:
+                if "wx" not in series: series["wx"] = Series(WEATHER_FIELDS)
+                series["wx"].add(t, pkt.weather)
+            if pkt.telemetry:
+                if "tlm" not in series: series["tlm"] = Series(TELEMETRY_FIELDS)
+                series["tlm"].add(t, pkt.telemetry)
+        return True
+
+    def fields(self, call):
+        with self.lock:
+            series = self.stations.get(call) or {}
+            return [name for s in series.values() for name in s.fields]
+
+    def calls(self):
+        with self.lock:
+            return list(self.stations)
+
+    def query(self, call, field, seconds=86400, resolution=None, now=None):
+        """
+        Values of one field over the last `seconds`.
+        resolution: 'raw', '5m', '1h' or None (the coarsest that still gives
+        ~one point per 5 minutes of window, at most a few hundred points).
+        Returns {"resolution", "time": [...], "value": [...], ("min", "max")}
+        as numpy arrays, or None when the station / field is unknown.
+        """
+        if now is None: now = time.time()
+        start = now - seconds
+        if resolution is None: resolution = self.pick_resolution(seconds)
+        with self.lock:
+            series = self.stations.get(call) or {}
+            s = next((s for s in series.values() if field in s.index), None)
+            if s is None: return None
+            col = s.index[field]
+            if resolution == "raw":
+                t, v = s.query_raw(col, start, now)
+                return {"resolution": "raw", "time": t, "value": v}
+            t, mean, lo, hi = s.buckets[resolution].query(col, start, now)
+        return {"resolution": resolution, "time": t, "value": mean, "min": lo, "max": hi}
+
+    @staticmethod
+    def pick_resolution(seconds):
+        if seconds <= 6 * 3600: return "raw"
+        for name, (step, size) in RESOLUTIONS.items():
+            if seconds <= step * size and seconds / step <= 600: return name
+        return next(reversed(RESOLUTIONS))
+
+def to_json(result):
+    """query() result -> JSON friendly dict (NaN -> null)"""
+    if result is None: return None
+    out = {"resolution": result["resolution"]}
+    for key, arr in result.items():
+        if key == "resolution": continue
+        out[key] = [None if math.isnan(x) else round(float(x), 3) for x in arr]
+    return out
@@ -0,0 +1,200 @@
+"""
+Caching tile proxy for the map themes.
+
+Tiles are stored as <cache_dir>/<theme>/<z>/<x>/<y>.png and evicted least
+recently used first once the cache grows over max_bytes. Concurrent
+requests for the same missing tile share a single upstream download.
+
+Prefetch an area for offline use:
+
+    python tiles.py --theme "U96 - Das Boot" --bbox 5.8,47.2,15.1,55.1 --zoom 5-10
+"""
+import os
+import re
+import sys
+import math
+import argparse
+import threading
+import urllib.request
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from settings import THEMES
+
+USER_AGENT = "APRS-Decoder tile proxy"
+MAX_ZOOM = 19
+
+def theme_key(name):
+    """URL/filesystem safe key for a theme name ('U96 - Das Boot' -> 'u96-das-boot')"""
+    return re.sub(r'[^a-z0-9]+', '-', name.lower()).strip('-')
+
+def tile_xy(lat, lon, z):
+    """Slippy map tile containing lat/lon at zoom z"""
+    n = 2 ** z
+    lat = max(min(lat, 85.0511), -85.0511)
+    x = int((lon + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+def tile_range(bbox, z):
+    """All (x, y) tiles covering bbox = (west, south, east, north) at zoom z"""
+    west, south, east, north = bbox
+    x0, y0 = tile_xy(north, west, z)
+    x1, y1 = tile_xy(south, east, z)
+    for x in range(x0, x1 + 1):
+        for y in range(y0, y1 + 1):
+            yield x, y
+
+class TileCache:
+    def __init__(self, cache_dir="tile_cache", max_bytes=256 * 1024 * 1024, upstreams=None, timeout=10):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        if upstreams is None:
+            upstreams = {theme_key(name): t["map_server"] for name, t in THEMES.items()}
+        self.upstreams = upstreams
+
+        self.lock = threading.Lock()
+        self.lru = OrderedDict()   # relative path -> size, oldest first
+        self.total = 0
+        self.inflight = {}         # relative path -> [Event, data]
+
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._scan()
+
+    def _scan(self):
+        """Rebuilds the LRU order from the files already on disk"""
+        if not os.path.isdir(self.cache_dir): return
+        files = []
+        for root, _, names in os.walk(self.cache_dir):
+            for name in names:
+                if not name.endswith(".png"): continue
+                path = os.path.join(root, name)
+                try: st = os.stat(path)
+                except OSError: continue
+                files.append((st.st_atime, os.path.relpath(path, self.cache_dir), st.st_size))
+        for _, rel, size in sorted(files):
+            self.lru[rel] = size
+            self.total += size
+        self._evict()
+
+    def url_template(self, theme):
+        return self.upstreams.get(theme)
+
+    def get(self, theme, z, x, y):
+        """Returns tile bytes (from disk or upstream) or None"""
+        if theme not in self.upstreams or not 0 <= z <= MAX_ZOOM: return None
+        if not (0 <= x < 2 ** z and 0 <= y < 2 ** z): return None
+        rel = os.path.join(theme, str(z), str(x), f"{y}.png")
+
+        with self.lock:
+            if rel in self.lru:
+                self.lru.move_to_end(rel)
+                cached = True
+            else:
+                cached = False
+                waiter = self.inflight.get(rel)
+                if waiter is None:
+                    waiter = self.inflight[rel] = [threading.Event(), None]
+                    leader = True
+                else:
+                    leader = False
+
+        if cached:
+            try:
+                with open(os.path.join(self.cache_dir, rel), 'rb') as f:
+                    self.hits += 1
+                    return f.read()
+            except OSError:
+                # File vanished, forget it and download again
+                with self.lock:
+                    self.total -= self.lru.pop(rel, 0)
+                return self.get(theme, z, x, y)
+
+        if not leader:
+            # Someone else is already downloading this tile
+            waiter[0].wait(self.timeout + 1)
+            return waiter[1]
+
+        data = None
+        try:
+            self.misses += 1
+            data = self._fetch(self.upstreams[theme].format(z=z, x=x, y=y, s='a'))
+            if data: self._store(rel, data)
+        finally:
+            waiter[1] = data
+            waiter[0].set()
+            with self.lock:
+                self.inflight.pop(rel, None)
+        return data
+
+    def _fetch(self, url):
+        req = urllib.request.Request(url, headers={"User-Agent": USER_AGENT})
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as r:
+                if r.status == 200: return r.read()
+        except Exception:
+            self.errors += 1
+        return None
+
+    def _store(self, rel, data):
+        path = os.path.join(self.cache_dir, rel)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = path + ".tmp"
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError:
+            return
+        with self.lock:
+            self.total += len(data) - self.lru.pop(rel, 0)
+            self.lru[rel] = len(data)
+            self._evict()
+
+    def _evict(self):
+        while self.total > self.max_bytes and self.lru:
+            rel, size = self.lru.popitem(last=False)
+            self.total -= size
+            try: os.remove(os.path.join(self.cache_dir, rel))
+            except OSError: pass
+
+    def prefetch(self, theme, bbox, zooms, workers=4, progress=None):
+        """Downloads all tiles of bbox for the given zoom levels. Returns count"""
+        tiles = [(z, x, y) for z in zooms for x, y in tile_range(bbox, z)]
+        done = 0
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for _ in pool.map(lambda t: self.get(theme, *t), tiles):
+                done += 1
+                if progress: progress(done, len(tiles))
+        return done
+
+    def stats(self):
+        return {"tiles": len(self.lru), "bytes": self.total, "hits": self.hits,
+                "misses": self.misses, "errors": self.errors}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prefetch map tiles into the cache")
+    parser.add_argument("--theme", default="Windows (Default)", choices=list(THEMES.keys()))
+    parser.add_argument("--bbox", required=True, help="west,south,east,north")
+    parser.add_argument("--zoom", default="5-10", help="zoom range, e.g. 5-10")
+    parser.add_argument("--cache", default="tile_cache")
+    parser.add_argument("--max-mb", type=int, default=256)
+    args = parser.parse_args(argv)
+
+    bbox = [float(v) for v in args.bbox.split(',')]
+    z0, _, z1 = args.zoom.partition('-')
+    zooms = range(int(z0), int(z1 or z0) + 1)
+
+    cache = TileCache(args.cache, args.max_mb * 1024 * 1024)
+    def progress(done, total):
+        if done % 100 == 0 or done == total:
+            print(f"{done}/{total} tiles", flush=True)
+    cache.prefetch(theme_key(args.theme), bbox, zooms, progress=progress)
+    print(cache.stats())
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())